@@ -1,22 +1,138 @@
 # app/__init__.py
 
-from flask import Flask, render_template, url_for, request
+from flask import Flask, url_for, current_app
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 import logging
+import orjson
 import os
+import threading
+import time
 from .config import Config, init_security
 
+__all__ = ['create_app', 'db', 'migrate', 'get_model_coordinator']
+
 # Initialize extensions
 db = SQLAlchemy()
 migrate = Migrate()
 
+_INSTANCE_READY = set()
+
+def _ensure_instance_path(path):
+    if path not in _INSTANCE_READY:
+        os.makedirs(path, exist_ok=True)
+        _INSTANCE_READY.add(path)
+
+def _configure_logging():
+    # Only configure once; basicConfig would otherwise open another app.log handle per app
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('app.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for faster API responses."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# One model coordinator per process, shared by every app created in it. Under a
+# preloading server (gunicorn --preload) workers inherit the loaded models from
+# the parent via copy-on-write instead of each loading their own copy.
+_coordinator = None
+_coordinator_ready = threading.Event()
+_warmup_lock = threading.Lock()
+_warmup_started = False
+# Seconds to wait after a failed warmup before another request retries it
+MODEL_WARMUP_RETRY_SECONDS = 30
+_warmup_retry_at = 0.0
+
+def _warm_model_coordinator(logger):
+    global _coordinator, _warmup_started, _warmup_retry_at
+    try:
+        from .ml.model_coordinator import ModelCoordinator
+        coordinator = ModelCoordinator()
+        if coordinator.initialize_models():
+            _coordinator = coordinator
+            logger.info("Model coordinator initialized successfully")
+        else:
+            logger.error("Failed to initialize model coordinator")
+    except Exception as e:
+        logger.error(f"Error initializing model coordinator: {e}")
+    finally:
+        if _coordinator is None:
+            # Allow a later get_model_coordinator() to retry once the backoff passes
+            with _warmup_lock:
+                _warmup_started = False
+                _warmup_retry_at = time.monotonic() + MODEL_WARMUP_RETRY_SECONDS
+            logger.error(f"Model warmup failed; retrying in {MODEL_WARMUP_RETRY_SECONDS}s")
+        _coordinator_ready.set()
+
+def _start_model_warmup(logger):
+    """Load the process-wide model coordinator on a background thread.
+    
+    `_coordinator_ready` is set once an attempt finishes. On failure the
+    coordinator is left as None so callers degrade instead of waiting forever,
+    and the next call after MODEL_WARMUP_RETRY_SECONDS starts a new attempt.
+    """
+    global _warmup_started
+    with _warmup_lock:
+        if _warmup_started or _coordinator is not None or time.monotonic() < _warmup_retry_at:
+            return
+        _warmup_started = True
+        _coordinator_ready.clear()
+    threading.Thread(
+        target=_warm_model_coordinator, args=(logger,), name='model-warmup', daemon=True
+    ).start()
+
+def _reset_warmup_after_fork():
+    # A child forked mid-warmup doesn't get the loading thread, so let it start
+    # its own; a finished warmup is inherited as-is.
+    global _coordinator_ready, _warmup_lock, _warmup_started
+    _warmup_lock = threading.Lock()
+    if not _coordinator_ready.is_set():
+        _coordinator_ready = threading.Event()
+        _warmup_started = False
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_warmup_after_fork)
+
+def get_model_coordinator(timeout=None):
+    """Return the process's model coordinator, waiting for warmup if needed.
+    
+    Returns None if the models failed to load or aren't ready within `timeout`
+    seconds (defaults to MODEL_READY_TIMEOUT; pass 0 to not wait at all).
+    """
+    if timeout is None:
+        timeout = current_app.config.get('MODEL_READY_TIMEOUT', 30)
+    _start_model_warmup(current_app.logger)
+    if not _coordinator_ready.wait(timeout):
+        return None
+    return _coordinator
+
+def static_url(filename):
+    return url_for('static', filename=filename, _external=True)
+
 def create_app(test_config=None):
     app = Flask(__name__,
                 static_folder='static',
                 static_url_path='/static',
                 template_folder='templates')
+    app.json = ORJSONProvider(app)
     
     if test_config is None:
         app.config.from_object(Config)
@@ -30,20 +146,14 @@ def create_app(test_config=None):
 
     with app.app_context():
         from . import models
-        # Now that db is registered with the app, create tables:
-        db.create_all()
+        # Once Flask-Migrate migrations exist they own the schema; until then (or
+        # when asked) create any missing tables at startup
+        has_migrations = os.path.isdir(app.extensions['migrate'].directory)
+        if app.config.get('AUTO_CREATE_TABLES', False) or not has_migrations:
+            db.create_all()
 
-        # Initialize model coordinator and routes (example)
-        try:
-            from .ml.model_coordinator import ModelCoordinator
-            app.model_coordinator = ModelCoordinator()
-            if not app.model_coordinator.initialize_models():
-                app.logger.error("Failed to initialize model coordinator")
-                raise RuntimeError("Model coordinator initialization failed")
-            app.logger.info("Model coordinator initialized successfully")
-        except Exception as e:
-            app.logger.error(f"Error initializing model coordinator: {e}")
-            raise
+        # Load the models in the background so route registration isn't blocked
+        _start_model_warmup(app.logger)
 
         try:
             from .routes import init_routes
@@ -57,24 +167,17 @@ def create_app(test_config=None):
         init_security(app)
 
     # Configure context processor and error handlers
+    # Config is final at this point, so the template context never changes
+    template_context = {
+        'static_url': static_url,
+        'google_maps_api_key': app.config.get('GOOGLE_MAPS_API_KEY')
+    }
+
     @app.context_processor
     def utility_processor():
-        return {
-            'static_url': lambda filename: url_for('static', filename=filename, _external=True),
-            'google_maps_api_key': app.config.get('GOOGLE_MAPS_API_KEY')
-        }
+        return template_context
 
-    # Ensure the instance folder exists
-    os.makedirs(app.instance_path, exist_ok=True)
-
-    # Configure logging (if needed)
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('app.log'),
-            logging.StreamHandler()
-        ]
-    )
+    _ensure_instance_path(app.instance_path)
+    _configure_logging()
     app.logger.info("Application initialization completed successfully")
     return app
@@ -1,21 +1,13 @@
 import os
+from dotenv import load_dotenv
 from flask_talisman import Talisman
 from datetime import timedelta
 from flask import request
 
-class ModelConfig:
-    RF_MODEL_PATH = os.path.join('models', 'pathfinder_model.pkl')
-    REQUIRED_FEATURES = ['distance', 'elevation_gain', 'has_sidewalks', 'is_lit', 'surface_type']
-    RF_CLASSIFIER_PARAMS = {
-        'n_estimators': 100,
-        'max_depth': 10,
-        'random_state': 42
-    }
-    GB_REGRESSOR_PARAMS = {
-        'n_estimators': 100,
-        'learning_rate': 0.1,
-        'random_state': 42
-    }
+# Load .env once per process; deployments that export their settings can
+# set CONFIG_CACHED to skip reading and parsing the file entirely.
+if not os.getenv('CONFIG_CACHED'):
+    load_dotenv(override=False)
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev'
@@ -28,15 +20,44 @@ class Config:
     MYSQL_PORT = int(os.environ.get('MYSQL_PORT', 3306))
 
     SQLALCHEMY_DATABASE_URI = (
-        f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}"
+        f"mysql+mysqldb://{MYSQL_USER}:{MYSQL_PASSWORD}"
         f"@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Keep warm MySQL connections around instead of reconnecting per request
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,  # Below MySQL's default wait_timeout
+        'pool_pre_ping': True,
+        'connect_args': {'charset': 'utf8mb4'},
+        # Batch size for multi-row INSERT ... VALUES on bulk ORM inserts
+        'insertmanyvalues_page_size': 1000,
+        # Compiled SQL cache entries; sized so the search/preferences/feedback
+        # statement variants all stay cached instead of being recompiled
+        'query_cache_size': 1200
+    }
+    # Create missing tables at startup even when a migrations/ directory exists
+    AUTO_CREATE_TABLES = os.environ.get('AUTO_CREATE_TABLES', 'false').lower() == 'true'
     PERMANENT_SESSION_LIFETIME = timedelta(days=31)
     MODEL_DIR = os.environ.get('MODEL_DIR', 'models')
+    # Seconds a request will wait for background model warmup before degrading
+    MODEL_READY_TIMEOUT = int(os.environ.get('MODEL_READY_TIMEOUT', 30))
+
+STATIC_SECURITY_HEADERS = (
+    ('X-Content-Type-Options', 'nosniff'),
+    ('X-Frame-Options', 'SAMEORIGIN'),
+    ('X-XSS-Protection', '1; mode=block'),
+)
+
+def _build_csp_header(csp):
+    return '; '.join(
+        f"{directive} {' '.join(sorted(set(sources)))}"
+        for directive, sources in csp.items()
+    )
 
 def init_security(app):
-    from flask import request
     # Define CSP with additional allowed domains:
     csp = {
         'default-src': ["'self'"],
@@ -85,26 +106,17 @@ def init_security(app):
         'manifest-src': ["'self'"]
     }
 
-    @app.before_request
-    def before_request_func():
-        if app.debug:
-            # Append local development URLs only once.
-            for directive, sources in csp.items():
-                if "http://127.0.0.1:5000" not in sources:
-                    sources.append("http://127.0.0.1:5000")
-                if "http://localhost:5000" not in sources:
-                    sources.append("http://localhost:5000")
+    # Build the header values once; local dev origins are only allowed in debug.
+    dev_origins = ["http://127.0.0.1:5000", "http://localhost:5000"]
+    csp_prod = _build_csp_header(csp)
+    csp_dev = _build_csp_header(
+        {directive: sources + dev_origins for directive, sources in csp.items()}
+    )
 
     @app.after_request
     def add_security_headers(response):
-        csp_string = '; '.join(
-            f"{directive} {' '.join(sorted(set(sources)))}"
-            for directive, sources in csp.items()
-        )
-        response.headers['Content-Security-Policy'] = csp_string
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
+        response.headers['Content-Security-Policy'] = csp_dev if app.debug else csp_prod
+        response.headers.update(STATIC_SECURITY_HEADERS)
         if request.path.startswith('/static/'):
             response.headers['Access-Control-Allow-Origin'] = '*'
         return response
@@ -1,16 +1,35 @@
+import math
 import os
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingRegressor
-from sklearn.preprocessing import StandardScaler
+from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
 import joblib
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, List, Sequence
 import logging
-from datetime import datetime
+import pickle
+import threading
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
 from .config import ModelConfig
 
 logger = logging.getLogger(__name__)
 
+_ISO_NOW = (0.0, '')
+
+def utc_now_iso() -> str:
+    """Return the current UTC time as an ISO string, reformatted at most every 100 ms."""
+    global _ISO_NOW
+    now = time.monotonic()
+    if now >= _ISO_NOW[0]:
+        _ISO_NOW = (now + 0.1, datetime.now(timezone.utc).isoformat())
+    return _ISO_NOW[1]
+
+_MODEL_SINGLETON: Optional['PathfinderAI'] = None
+_MODEL_LOCK = threading.Lock()
+
 def init_ai_model():
     """Initialize the AI model for the application."""
     try:
@@ -23,33 +42,58 @@ def init_ai_model():
         logger.error(f"Error initializing AI model: {str(e)}")
         raise
 
+def get_ai_model() -> 'PathfinderAI':
+    """Return the process-wide PathfinderAI, loading it on first use.
+    
+    Loading before workers fork (e.g. gunicorn --preload) lets them share
+    the deserialized models instead of each unpickling their own copy.
+    """
+    global _MODEL_SINGLETON
+    if _MODEL_SINGLETON is None:
+        with _MODEL_LOCK:
+            if _MODEL_SINGLETON is None:
+                _MODEL_SINGLETON = init_ai_model()
+    return _MODEL_SINGLETON
+
 class PathfinderAI:
     def __init__(self):
         self.model_path = ModelConfig.RF_MODEL_PATH
-        self.route_classifier: Optional[RandomForestClassifier] = None
-        self.difficulty_predictor: Optional[GradientBoostingRegressor] = None
+        self.route_classifier: Optional[HistGradientBoostingClassifier] = None
+        self.difficulty_predictor: Optional[HistGradientBoostingRegressor] = None
         self.scaler = StandardScaler()
+        self.encoder: Optional[OneHotEncoder] = None
         self.logger = logging.getLogger(__name__)
         self.model_version = "1.0.0"
         self.last_training_date: Optional[datetime] = None
         self.required_features = ModelConfig.REQUIRED_FEATURES
+        self.feature_names: List[str] = []
+        self._feature_index: Dict[str, int] = {}
+        self._n_features = 0
+        self._numerical_idx: List[int] = []
+        self._scaler_mean = np.empty(0, dtype=np.float32)
+        self._scaler_inv_scale = np.empty(0, dtype=np.float32)
         
     def init_models(self) -> bool:
         """Initialize or load ML models with validation."""
         try:
-            if os.path.exists(self.model_path):
-                models = joblib.load(self.model_path)
-                self.route_classifier = models['classifier']
-                self.difficulty_predictor = models['regressor']
-                self.scaler = models.get('scaler', StandardScaler())
-                self.model_version = models.get('version', "1.0.0")
-                self.last_training_date = models.get('training_date')
-                return self.validate_models()
-                
-            self.logger.warning("No existing models found, initializing new ones")
-            self.route_classifier = RandomForestClassifier(**ModelConfig.RF_CLASSIFIER_PARAMS)
-            self.difficulty_predictor = GradientBoostingRegressor(**ModelConfig.GB_REGRESSOR_PARAMS)
-            return True
+            mmap_mode = 'r' if ModelConfig.MODEL_COMPRESSION == 'none' else None
+            try:
+                models = joblib.load(self.model_path, mmap_mode=mmap_mode)
+            except FileNotFoundError:
+                self.logger.warning("No existing models found, initializing new ones")
+                self.route_classifier = HistGradientBoostingClassifier(**ModelConfig.CLASSIFIER_PARAMS)
+                self.difficulty_predictor = HistGradientBoostingRegressor(**ModelConfig.REGRESSOR_PARAMS)
+                return True
+
+            self.route_classifier = models['classifier']
+            self.difficulty_predictor = models['regressor']
+            self.scaler = models.get('scaler', StandardScaler())
+            self.encoder = models.get('encoder')
+            self.feature_names = list(models.get('feature_names', []))
+            self.model_version = models.get('version', "1.0.0")
+            self.last_training_date = models.get('training_date')
+            self._index_features()
+            return self.validate_models()
         except Exception as e:
             self.logger.error(f"Error initializing models: {str(e)}")
             return False
@@ -57,18 +101,18 @@ class PathfinderAI:
     def validate_models(self) -> bool:
         """Validate the loaded models using test data."""
         try:
-            # Create test data
-            test_data = pd.DataFrame([{
-                'distance': 5.0,
-                'elevation_gain': 100.0,
-                'has_sidewalks': 1,
-                'is_lit': 1,
-                'surface_type': 'asphalt'
-            }])
+            # Create a test route with the attributes prepare_route_features reads
+            test_route = SimpleNamespace(
+                distance=5.0,
+                elevation_gain=100.0,
+                has_sidewalks=1,
+                is_lit=1,
+                surface_type='asphalt'
+            )
             
             # Test feature preparation using our method
-            features = self.prepare_route_features(test_data.iloc[0])
-            if features.empty:
+            features = self.prepare_route_features(test_route)
+            if features.size == 0:
                 raise ValueError("Failed to prepare test features")
             
             # Test predictions
@@ -84,63 +128,85 @@ class PathfinderAI:
             self.logger.error(f"Model validation failed: {str(e)}")
             return False
 
-    def prepare_route_features(self, route: Any) -> pd.DataFrame:
+    def _index_features(self) -> None:
+        """Cache the model's column layout for building feature vectors."""
+        if not self.feature_names and hasattr(self.route_classifier, 'feature_names_in_'):
+            self.feature_names = list(self.route_classifier.feature_names_in_)
+        self._feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        self._n_features = len(self._feature_index)
+        self._numerical_idx = [
+            self._feature_index[name] for name in ('distance', 'elevation_gain')
+            if name in self._feature_index
+        ]
+        # Scaler parameters as float32 so scaling can run in place on feature rows
+        if hasattr(self.scaler, 'mean_'):
+            self._scaler_mean = self.scaler.mean_.astype(np.float32)
+            self._scaler_inv_scale = (1.0 / self.scaler.scale_).astype(np.float32)
+
+    def _scale_numerical(self, X: np.ndarray) -> None:
+        """Standardize the numerical columns of X in place, without scaler.transform."""
+        if len(self._scaler_mean) != len(self._numerical_idx):
+            raise ValueError("Scaler has not been fitted")
+        for col, mean, inv_scale in zip(self._numerical_idx, self._scaler_mean, self._scaler_inv_scale):
+            column = X[:, col]
+            column -= mean
+            column *= inv_scale
+
+    def _fill_feature_row(self, row: np.ndarray, route: Any) -> None:
+        """Write one route's raw (unscaled) features into a zeroed row."""
+        index = self._feature_index
+        row[index['distance']] = route.distance
+        row[index['elevation_gain']] = route.elevation_gain or 0.0
+        if 'has_sidewalks' in index:
+            row[index['has_sidewalks']] = int(getattr(route, 'has_sidewalks', 0) or 0)
+        if 'is_lit' in index:
+            row[index['is_lit']] = int(getattr(route, 'is_lit', 0) or 0)
+        surface = getattr(route, 'surface_type', 'unknown')
+        surface_col = index.get(f"surface_{getattr(surface, 'value', surface)}")
+        if surface_col is not None:
+            row[surface_col] = 1.0
+
+    def prepare_route_features(self, route: Any) -> np.ndarray:
         """Prepare and validate features for model prediction.
         
         Expects `route` to have attributes matching the required features.
+        Returns a (1, F) array in the classifier's column order, or an empty
+        array if the features could not be prepared.
         """
         try:
             # Check for required features
             missing_features = [f for f in self.required_features if not hasattr(route, f)]
             if missing_features:
                 raise ValueError(f"Missing required features: {missing_features}")
+            if not self._n_features:
+                raise ValueError("Classifier has not been trained")
             
-            features = pd.DataFrame([{
-                'distance': float(route.distance),
-                'elevation_gain': float(route.elevation_gain) if route.elevation_gain else 0.0,
-                'has_sidewalks': int(getattr(route, 'has_sidewalks', 0)),
-                'is_lit': int(getattr(route, 'is_lit', 0)),
-                'surface_type': str(getattr(route, 'surface_type', 'unknown'))
-            }])
-            
-            # One-hot encode categorical variables
-            if 'surface_type' in features:
-                features = pd.get_dummies(features, columns=['surface_type'], prefix=['surface'])
-            
-            # Ensure all expected columns exist if the classifier has been trained
-            if self.route_classifier and hasattr(self.route_classifier, 'feature_names_in_'):
-                expected_columns = self.route_classifier.feature_names_in_
-                for col in expected_columns:
-                    if col not in features:
-                        features[col] = 0
-                features = features[expected_columns]
-            
+            features = np.zeros((1, self._n_features), dtype=np.float32)
+            self._fill_feature_row(features[0], route)
             return features
         except Exception as e:
             self.logger.error(f"Error preparing features: {str(e)}")
-            return pd.DataFrame()
+            return np.empty((0, 0), dtype=np.float32)
 
-    def predict_route_properties(self, features: pd.DataFrame) -> Dict[str, Any]:
+    def predict_route_properties(self, features: np.ndarray) -> Dict[str, Any]:
         """Make predictions using both the classifier and regressor."""
         try:
-            if features.empty:
+            if features.size == 0:
                 raise ValueError("Empty features provided")
             
             if not self.route_classifier or not self.difficulty_predictor:
                 raise ValueError("Models not initialized")
 
-            # Scale numerical features if present
-            numerical_cols = ['distance', 'elevation_gain']
-            numerical_cols = [col for col in numerical_cols if col in features.columns]
-            if numerical_cols:
-                features[numerical_cols] = self.scaler.transform(features[numerical_cols])
+            # Scale numerical features on a copy so the caller's array is untouched
+            features = features.copy()
+            self._scale_numerical(features)
             
             predictions = {
                 'route_type': self.route_classifier.predict(features)[0],
                 'difficulty_score': float(self.difficulty_predictor.predict(features)[0]),
                 'confidence_score': float(max(self.route_classifier.predict_proba(features)[0])),
                 'model_version': self.model_version,
-                'prediction_timestamp': datetime.utcnow().isoformat()
+                'prediction_timestamp': utc_now_iso()
             }
             return predictions
         except Exception as e:
@@ -150,52 +216,122 @@ class PathfinderAI:
                 'difficulty_score': 0.5,
                 'confidence_score': 0.0,
                 'model_version': self.model_version,
-                'prediction_timestamp': datetime.utcnow().isoformat(),
+                'prediction_timestamp': utc_now_iso(),
                 'error': str(e)
             }
 
+    def prepare_route_features_batch(self, routes: Sequence[Any]) -> np.ndarray:
+        """Build an (N, F) feature matrix in the classifier's column order."""
+        if not self._n_features:
+            raise ValueError("Classifier has not been trained")
+
+        X = np.zeros((len(routes), self._n_features), dtype=np.float32)
+        for i, route in enumerate(routes):
+            self._fill_feature_row(X[i], route)
+
+        self._scale_numerical(X)
+        return X
+
+    def predict_batch(self, routes: Sequence[Any]) -> List[Dict[str, Any]]:
+        """Predict properties for many routes with one call per model."""
+        if not routes:
+            return []
+        try:
+            if not self.route_classifier or not self.difficulty_predictor:
+                raise ValueError("Models not initialized")
+
+            X = self.prepare_route_features_batch(routes)
+            route_types = self.route_classifier.predict(X)
+            difficulty_scores = self.difficulty_predictor.predict(X)
+            confidence_scores = self.route_classifier.predict_proba(X).max(axis=1)
+
+            timestamp = utc_now_iso()
+            return [
+                {
+                    'route_type': route_type,
+                    'difficulty_score': float(difficulty),
+                    'confidence_score': float(confidence),
+                    'model_version': self.model_version,
+                    'prediction_timestamp': timestamp
+                }
+                for route_type, difficulty, confidence
+                in zip(route_types, difficulty_scores, confidence_scores)
+            ]
+        except Exception as e:
+            self.logger.error(f"Error making batch predictions: {str(e)}")
+            timestamp = utc_now_iso()
+            return [
+                {
+                    'route_type': 'unknown',
+                    'difficulty_score': 0.5,
+                    'confidence_score': 0.0,
+                    'model_version': self.model_version,
+                    'prediction_timestamp': timestamp,
+                    'error': str(e)
+                }
+                for _ in routes
+            ]
+
     def train(self, X: pd.DataFrame, y: Dict[str, np.ndarray], validation_split: float = 0.2) -> bool:
         """Train both models with validation data."""
         try:
             if X.empty or not y or 'route_type' not in y or 'difficulty' not in y:
                 raise ValueError("Invalid training data")
             
-            # One-hot encode surface_type if present
+            # Scale numerical features; the binary flags pass through unchanged
+            dense_cols = [col for col in X.columns if col != 'surface_type']
+            X_dense = X[dense_cols].to_numpy(dtype=np.float32)
+            numerical_idx = [dense_cols.index(col) for col in ('distance', 'elevation_gain')]
+            X_dense[:, numerical_idx] = self.scaler.fit_transform(X_dense[:, numerical_idx])
+            feature_names = list(dense_cols)
+            blocks = [X_dense]
+            
+            # One-hot encode surface_type if present; the histogram estimators need dense input
             if 'surface_type' in X:
-                X = pd.get_dummies(X, columns=['surface_type'], prefix=['surface'])
-                
-            # Scale numerical features
-            numerical_cols = ['distance', 'elevation_gain']
-            numerical_cols = [col for col in numerical_cols if col in X.columns]
-            if numerical_cols:
-                X[numerical_cols] = self.scaler.fit_transform(X[numerical_cols])
-            
-            # Split data for training/validation
-            split_idx = int(len(X) * (1 - validation_split))
-            X_train, X_val = X[:split_idx], X[split_idx:]
-            y_train_type, y_val_type = y['route_type'][:split_idx], y['route_type'][split_idx:]
-            y_train_diff, y_val_diff = y['difficulty'][:split_idx], y['difficulty'][split_idx:]
-            
-            # Initialize models if needed
-            if self.route_classifier is None:
-                self.route_classifier = RandomForestClassifier(**ModelConfig.RF_CLASSIFIER_PARAMS)
-            if self.difficulty_predictor is None:
-                self.difficulty_predictor = GradientBoostingRegressor(**ModelConfig.GB_REGRESSOR_PARAMS)
+                self.encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=False, dtype=np.float32)
+                blocks.append(self.encoder.fit_transform(X[['surface_type']].astype(str)))
+                feature_names += [f"surface_{category}" for category in self.encoder.categories_[0]]
+            X = np.hstack(blocks)
+            
+            # Split data for training/validation, shuffled and stratified on route type so sorted inputs don't bias the scores
+            route_types = np.asarray(y['route_type'])
+            difficulty = np.asarray(y['difficulty'])
+            _, class_counts = np.unique(route_types, return_counts=True)
+            # Stratifying needs two samples per class and room for every class on both sides of the split
+            n_val = math.ceil(validation_split * len(route_types))
+            can_stratify = (class_counts.min() >= 2
+                            and min(n_val, len(route_types) - n_val) >= len(class_counts))
+            stratify = route_types if can_stratify else None
+            train_idx, val_idx = train_test_split(
+                np.arange(X.shape[0]),
+                test_size=validation_split,
+                stratify=stratify,
+                random_state=42
+            )
+            X_train, X_val = X[train_idx], X[val_idx]
+            y_train_type, y_val_type = route_types[train_idx], route_types[val_idx]
+            y_train_diff, y_val_diff = difficulty[train_idx], difficulty[val_idx]
+            
+            # Always start from the configured estimators so older model types get replaced
+            self.route_classifier = HistGradientBoostingClassifier(**ModelConfig.CLASSIFIER_PARAMS)
+            self.difficulty_predictor = HistGradientBoostingRegressor(**ModelConfig.REGRESSOR_PARAMS)
             
             # Train the classifier
-            self.logger.info("Training Random Forest classifier...")
+            self.logger.info("Training Histogram Gradient Boosting classifier...")
             self.route_classifier.fit(X_train, y_train_type)
             classifier_score = self.route_classifier.score(X_val, y_val_type)
             
             # Train the regressor
-            self.logger.info("Training Gradient Boosting regressor...")
+            self.logger.info("Training Histogram Gradient Boosting regressor...")
             self.difficulty_predictor.fit(X_train, y_train_diff)
             regressor_score = self.difficulty_predictor.score(X_val, y_val_diff)
+            self.feature_names = feature_names
+            self._index_features()
             
             self.logger.info(f"Training scores - Classifier: {classifier_score:.3f}, Regressor: {regressor_score:.3f}")
             
-            self.last_training_date = datetime.utcnow()
-            self.model_version = f"1.1.{int(datetime.utcnow().timestamp())}"
+            self.last_training_date = datetime.now(timezone.utc)
+            self.model_version = f"1.1.{int(datetime.now(timezone.utc).timestamp())}"
             
             return self.save_models()
         except Exception as e:
@@ -214,9 +350,10 @@ class PathfinderAI:
                 'classifier': self.route_classifier,
                 'regressor': self.difficulty_predictor,
                 'scaler': self.scaler,
+                'encoder': self.encoder,
                 'version': self.model_version,
                 'training_date': self.last_training_date,
-                'feature_names': list(self.route_classifier.feature_names_in_) if hasattr(self.route_classifier, 'feature_names_in_') else []
+                'feature_names': self.feature_names
             }
             
             backup_path = f"{self.model_path}.backup"
@@ -224,7 +361,8 @@ class PathfinderAI:
                 os.rename(self.model_path, backup_path)
             
             self.logger.info(f"Saving models to {self.model_path}")
-            joblib.dump(models, self.model_path)
+            compress = 0 if ModelConfig.MODEL_COMPRESSION == 'none' else (ModelConfig.MODEL_COMPRESSION, 3)
+            joblib.dump(models, self.model_path, compress=compress, protocol=pickle.HIGHEST_PROTOCOL)
             
             if os.path.exists(backup_path):
                 os.remove(backup_path)
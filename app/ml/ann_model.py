@@ -2,63 +2,66 @@ import os
 import numpy as np
 from typing import Optional, Dict, Any, List, Tuple
 import logging
-from datetime import datetime
-import json
+from datetime import datetime, timezone
+import orjson
 import pickle
 import warnings
+import joblib
 from sklearn.neural_network import MLPRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.exceptions import ConvergenceWarning
+from scipy.special import expit
 from .config import ModelConfig
 
-warnings.filterwarnings('ignore', category=ConvergenceWarning)
-
-def prepare_route_features(route_data: Dict[str, float]) -> np.ndarray:
-    """Prepare features for the ANN model in a consistent order."""
-    features = np.array([
-        route_data.get('distance', 0.0),
-        route_data.get('elevation_gain', 0.0),
-        route_data.get('traffic_level', 0.5),
-        route_data.get('surface_quality', 0.7),
-        route_data.get('safety_score', 0.8)
-    ]).reshape(1, -1)
-    return features
+__all__ = [
+    'PathfinderANN', 'prepare_route_features',
+    'DISTANCE', 'ELEVATION_GAIN', 'TRAFFIC_LEVEL', 'SURFACE_QUALITY', 'SAFETY_SCORE'
+]
+
+# In-place hidden layer activations matching MLPRegressor's `activation` options
+HIDDEN_ACTIVATIONS = {
+    'relu': lambda h: np.maximum(h, 0, out=h),
+    'tanh': lambda h: np.tanh(h, out=h),
+    'logistic': lambda h: expit(h, out=h),
+    'identity': lambda h: h
+}
+
+# Column positions in the ANN feature matrix (see PathfinderANN.feature_names)
+DISTANCE, ELEVATION_GAIN, TRAFFIC_LEVEL, SURFACE_QUALITY, SAFETY_SCORE = range(5)
+
+def prepare_route_features(distance: float = 0.0, elevation_gain: float = 0.0,
+                           traffic_level: float = 0.5, surface_quality: float = 0.7,
+                           safety_score: float = 0.8) -> np.ndarray:
+    """Prepare a (1, 5) float32 feature row for the ANN model in a consistent order."""
+    return np.array(
+        ((distance, elevation_gain, traffic_level, surface_quality, safety_score),),
+        dtype=np.float32
+    )
 
 class PathfinderANN:
     def __init__(self):
-        self.model_dir = os.getenv("MODEL_DIR", "models")
-        os.makedirs(self.model_dir, exist_ok=True)
-        self.model_path = os.path.join(self.model_dir, "pathfinder_ann.pkl")
-        self.metadata_path = os.path.join(self.model_dir, "pathfinder_ann_metadata.json")
+        # Resolved per instance so a MODEL_DIR set after import (e.g. by tests) applies
+        self.model_dir = os.getenv('MODEL_DIR', ModelConfig.MODEL_DIR)
+        self.model_path = os.path.join(self.model_dir, os.path.basename(ModelConfig.ANN_MODEL_PATH))
+        self.metadata_path = os.path.join(self.model_dir, os.path.basename(ModelConfig.ANN_METADATA_PATH))
         self.model: Optional[MLPRegressor] = None
         self.scaler: Optional[StandardScaler] = None
+        self._weights: List[np.ndarray] = []
+        self._biases: List[np.ndarray] = []
+        self._activation = None
         self.input_shape: Optional[int] = 5
         self.logger = logging.getLogger(__name__)
         self.model_version = "1.0.0"
         self.last_training_date: Optional[datetime] = None
-        self.feature_names: List[str] = [
-            'distance', 'elevation_gain', 'traffic_level',
-            'surface_quality', 'safety_score'
-        ]
+        self.feature_names: List[str] = list(ModelConfig.ANN_FEATURES)
 
     def build_model(self) -> None:
         """Build a new ANN model using sklearn's MLPRegressor."""
         try:
             self.logger.info("Building new ANN model...")
             self.scaler = StandardScaler()
-            self.model = MLPRegressor(
-                hidden_layer_sizes=(128, 64, 32),
-                activation='relu',
-                solver='adam',
-                alpha=0.0001,
-                batch_size=32,
-                learning_rate='adaptive',
-                max_iter=1000,
-                early_stopping=True,
-                validation_fraction=0.1,
-                n_iter_no_change=10,
-                random_state=42
-            )
+            self._weights, self._biases = [], []
+            self.model = MLPRegressor(**ModelConfig.ANN_PARAMS)
             self.logger.info("ANN model built successfully")
         except Exception as e:
             self.logger.error(f"Error building ANN model: {str(e)}")
@@ -67,24 +70,27 @@ class PathfinderANN:
     def load_model(self) -> bool:
         """Load the saved ANN model and its metadata."""
         try:
-            if not os.path.exists(self.model_path):
+            try:
+                # Memory-map the weight arrays so worker processes share the pages
+                model_data = joblib.load(self.model_path, mmap_mode='r')
+            except FileNotFoundError:
                 self.logger.warning(f"No saved ANN model found at {self.model_path}")
                 self.build_model()
                 return True
-
-            with open(self.model_path, 'rb') as f:
-                model_data = pickle.load(f)
-                self.model = model_data['model']
-                self.scaler = model_data['scaler']
-
-            if os.path.exists(self.metadata_path):
-                with open(self.metadata_path, 'r') as f:
-                    metadata = json.load(f)
-                    self.model_version = metadata.get('version', self.model_version)
-                    self.last_training_date = datetime.fromisoformat(
-                        metadata.get('training_date', datetime.utcnow().isoformat())
-                    )
-                    self.feature_names = metadata.get('feature_names', self.feature_names)
+            self.model = model_data['model']
+            self.scaler = model_data['scaler']
+            self._fold_scaler()
+
+            try:
+                with open(self.metadata_path, 'rb') as f:
+                    metadata = orjson.loads(f.read())
+            except FileNotFoundError:
+                return True
+            self.model_version = metadata.get('version', self.model_version)
+            self.last_training_date = datetime.fromisoformat(
+                metadata.get('training_date', datetime.now(timezone.utc).isoformat())
+            )
+            self.feature_names = metadata.get('feature_names', self.feature_names)
             return True
         except Exception as e:
             self.logger.error(f"Error loading ANN model: {str(e)}")
@@ -103,7 +109,10 @@ class PathfinderANN:
             X_scaled = self.scaler.fit_transform(X)
 
             self.logger.info("Starting ANN model training...")
-            self.model.fit(X_scaled, y)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', ConvergenceWarning)
+                self.model.fit(X_scaled, y)
+            self._fold_scaler()
 
             train_score = self.model.score(X_scaled, y)
             metrics = {
@@ -112,8 +121,8 @@ class PathfinderANN:
                 'n_iter': int(self.model.n_iter_)
             }
 
-            self.last_training_date = datetime.utcnow()
-            self.model_version = f"1.1.{int(datetime.utcnow().timestamp())}"
+            self.last_training_date = datetime.now(timezone.utc)
+            self.model_version = f"1.1.{int(datetime.now(timezone.utc).timestamp())}"
             
             self.save_model(metrics)
             
@@ -123,34 +132,73 @@ class PathfinderANN:
             self.logger.error(f"Error training ANN model: {str(e)}")
             return False, {}
 
+    def _fold_scaler(self) -> None:
+        """Cache inference weights with the input scaler folded into the first layer.
+        
+        ((x - mean) / scale) @ W0 + b0 == x @ (W0 / scale) + (b0 - (mean / scale) @ W0),
+        so predictions can skip the separate scaler.transform pass. The stored
+        model and scaler are left untouched so they can still be saved.
+        """
+        inv_scale = 1.0 / self.scaler.scale_
+        W0 = self.model.coefs_[0]
+        weights = [W0 * inv_scale[:, np.newaxis]] + list(self.model.coefs_[1:])
+        biases = (
+            [self.model.intercepts_[0] - (self.scaler.mean_ * inv_scale) @ W0]
+            + list(self.model.intercepts_[1:])
+        )
+        # float32 halves the bytes moved per layer; outputs are clipped to [0, 1] anyway
+        self._weights = [W.astype(np.float32) for W in weights]
+        self._biases = [b.astype(np.float32) for b in biases]
+        self._activation = HIDDEN_ACTIVATIONS[self.model.activation]
+
+    def _forward(self, X: np.ndarray) -> np.ndarray:
+        """Run the MLP forward pass directly, skipping sklearn's input validation."""
+        h = X
+        for W, b in zip(self._weights[:-1], self._biases[:-1]):
+            h = h @ W
+            h += b
+            self._activation(h)
+        # MLPRegressor uses an identity output activation
+        return h @ self._weights[-1] + self._biases[-1]
+
     def predict_route_quality(self, features: np.ndarray) -> np.ndarray:
-        """Predict the route quality score using the ANN model."""
+        """Predict route quality scores for a (5,) vector or an (N, 5) batch.
+        
+        Returns an (N, 1) array; a batch costs one matmul per layer.
+        """
         try:
             if not self.model:
                 if not self.load_model():
                     raise ValueError("ANN model not initialized and couldn't be loaded")
-            features = np.array(features)
+            features = np.asarray(features, dtype=np.float32)
             if len(features.shape) == 1:
                 features = features.reshape(1, -1)
-            features_scaled = self.scaler.transform(features)
-            predictions = self.model.predict(features_scaled)
-            predictions = np.clip(predictions, 0, 1)
+            if not self._weights:
+                raise ValueError("ANN model has not been trained")
+            predictions = self._forward(features)
+            # Linear output, so clamp to [0, 1] in place; a plain scalar clamp
+            # is cheaper than ufunc dispatch for the single-route case
+            if predictions.size == 1:
+                predictions.flat[0] = min(max(predictions.item(), 0.0), 1.0)
+            else:
+                np.clip(predictions, 0, 1, out=predictions)
             return predictions.reshape(-1, 1)
         except Exception as e:
             self.logger.error(f"Error making ANN predictions: {str(e)}")
-            return np.array([[0.5]])  # Neutral prediction as fallback
+            n_rows = len(features) if getattr(features, 'ndim', 1) == 2 else 1
+            return np.full((n_rows, 1), 0.5, dtype=np.float32)  # Neutral prediction as fallback
 
     def save_model(self, metrics: Optional[Dict[str, float]] = None) -> bool:
         """Save the ANN model and metadata to disk."""
         try:
             if not self.model:
                 raise ValueError("No ANN model to save")
+            os.makedirs(self.model_dir, exist_ok=True)
             model_data = {
                 'model': self.model,
                 'scaler': self.scaler
             }
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(model_data, f)
+            joblib.dump(model_data, self.model_path, compress=0, protocol=pickle.HIGHEST_PROTOCOL)
 
             metadata = {
                 'version': self.model_version,
@@ -159,8 +207,10 @@ class PathfinderANN:
                 'input_shape': self.input_shape,
                 'metrics': metrics or {}
             }
-            with open(self.metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            with open(self.metadata_path, 'wb') as f:
+                f.write(orjson.dumps(
+                    metadata, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                ))
             return True
         except Exception as e:
             self.logger.error(f"Error saving ANN model: {str(e)}")
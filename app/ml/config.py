@@ -1,8 +1,4 @@
 import os
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
 
 class ModelConfig:
     # Base directory for all models
@@ -14,24 +10,27 @@ class ModelConfig:
     ANN_MODEL_PATH = os.path.join(MODEL_DIR, 'pathfinder_ann.pkl')
     ANN_METADATA_PATH = os.path.join(MODEL_DIR, 'pathfinder_ann_metadata.json')
     
-    # Model parameters for Random Forest classifier
-    RF_CLASSIFIER_PARAMS = {
-        'n_estimators': 100,
-        'max_depth': 10,
-        'min_samples_split': 5,
-        'random_state': 42,
-        'n_jobs': -1
+    # On-disk compression for model bundles ('lz4', 'zlib', ... or 'none').
+    # Uncompressed bundles are memory-mapped on load instead.
+    MODEL_COMPRESSION = os.getenv('MODEL_COMPRESSION', 'lz4')
+    
+    # Histogram gradient boosting classifier for route type
+    CLASSIFIER_PARAMS = {
+        'max_iter': 200,
+        'learning_rate': 0.1,
+        'max_depth': 8,
+        'random_state': 42
     }
     
-    # Model parameters for Gradient Boosting regressor
-    GB_REGRESSOR_PARAMS = {
-        'n_estimators': 100,
+    # Histogram gradient boosting regressor for difficulty
+    REGRESSOR_PARAMS = {
+        'max_iter': 200,
         'learning_rate': 0.1,
-        'max_depth': 5,
+        'max_depth': 8,
         'random_state': 42
     }
     
-    # ANN model parameters (if used elsewhere during training)
+    # ANN model parameters
     ANN_PARAMS = {
         'hidden_layer_sizes': (128, 64, 32),
         'activation': 'relu',
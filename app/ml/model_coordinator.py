@@ -1,34 +1,74 @@
 # app/ml/model_coordinator.py
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, List, Sequence, Tuple
 import numpy as np
-from cachetools import TTLCache, cached
-from datetime import datetime
+from cachetools import TTLCache, cachedmethod
+from cachetools.keys import hashkey
+from datetime import datetime, timezone
+from functools import lru_cache
 import joblib
 import logging
+import operator
 import os
+import threading
 from flask import current_app
 from ..models import Route
-from .ai_model import PathfinderAI
-from .ann_model import PathfinderANN, prepare_route_features
+from .ai_model import PathfinderAI, get_ai_model, utc_now_iso
+from .ann_model import (
+    PathfinderANN, prepare_route_features,
+    DISTANCE, ELEVATION_GAIN, TRAFFIC_LEVEL, SURFACE_QUALITY, SAFETY_SCORE
+)
 
 logger = logging.getLogger(__name__)
 
+# Preference value -> ANN feature score
+TRAFFIC_SCORES = {'avoid': 0.0, 'neutral': 0.5}
+SURFACE_SCORES = {'asphalt': 1.0, 'dirt': 0.7, 'grass': 0.4}
+
+@lru_cache(maxsize=256)
+def _preference_scores(traffic: Any, surface: Any, lighting: bool, sidewalks: bool) -> Tuple[float, float, float]:
+    """Traffic, surface and safety scores for one preference bundle."""
+    return (
+        TRAFFIC_SCORES.get(traffic, 0.5),
+        SURFACE_SCORES.get(surface, 0.7),
+        # 0.8 by default, plus 0.1 for each safety requirement
+        min(0.8 + 0.1 * lighting + 0.1 * sidewalks, 1.0)
+    )
+
+# Route columns the models read; loading just these skips full ORM hydration
+_FEATURE_COLUMNS = (
+    Route.id, Route.distance, Route.elevation_gain,
+    Route.has_sidewalks, Route.is_lit, Route.surface_type
+)
+
+def _prediction_cache_key(coordinator, route_id: int, user_preferences: Dict[str, Any]):
+    """Key cached predictions on the model generation, route id and preferences.
+    
+    Preference values are scalars, so the sorted items tuple is hashable as-is
+    and keeps their types (True and 'True' don't collide). Including the
+    generation means retraining never serves predictions from older models.
+    """
+    return hashkey(
+        coordinator.model_generation,
+        route_id,
+        tuple(sorted((user_preferences or {}).items()))
+    )
+
 class ModelCoordinator:
     def __init__(self):
         self.predictions_cache = TTLCache(maxsize=1000, ttl=3600)  # 1 hour TTL
+        self.predictions_lock = threading.Lock()
         self.version_hash = None
         self.rf_model: Optional[PathfinderAI] = None  # RF model via PathfinderAI
         self.ann_model: Optional[PathfinderANN] = None  # ANN model instance
         self.model_version = "unknown"
+        # Bumped on every retrain; part of the prediction cache key
+        self.model_generation = 0
         
     def initialize_models(self) -> bool:
         """Initialize both the RF and ANN models."""
         try:
-            # Initialize RF model using PathfinderAI
-            self.rf_model = PathfinderAI()
-            if not self.rf_model.init_models():
-                logger.error("Failed to initialize RF model in PathfinderAI")
-                return False
+            # Reuse the shared RF model so it is only deserialized once per process
+            self.rf_model = get_ai_model()
 
             # Initialize ANN model using PathfinderANN
             self.ann_model = PathfinderANN()
@@ -42,82 +82,113 @@ class ModelCoordinator:
             logger.error(f"Error initializing models: {e}", exc_info=True)
             return False
 
-    @cached(lambda self: self.predictions_cache)
+    # The cache lives on the instance and the key leaves out `self`, so entries
+    # don't keep coordinators alive or leak between instances
+    @cachedmethod(
+        operator.attrgetter('predictions_cache'),
+        key=_prediction_cache_key,
+        lock=operator.attrgetter('predictions_lock')
+    )
     def get_route_predictions(self, route_id: int, user_preferences: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            route = Route.query.get(route_id)
+            route = Route.query.with_entities(*_FEATURE_COLUMNS).filter(Route.id == route_id).first()
             if not route:
                 return self.get_fallback_predictions()
-                
-            # Prepare features for each model branch
-            # For the RF model, use its own feature preparation method.
-            rf_features = self.rf_model.prepare_route_features(route)
-            # For the ANN model, prepare features using our helper from ann_model.
-            ann_features = self.prepare_ann_features(route, user_preferences)
-            
-            predictions = self._generate_predictions(route, user_preferences)
-            return predictions
+            # _generate_predictions builds both models' features itself
+            return self._generate_predictions(route, user_preferences)
             
         except Exception as e:
             logger.error(f"Prediction error for route {route_id}: {e}")
             return self.get_fallback_predictions()
 
-    def _generate_predictions(self, route: Route, preferences: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate predictions by combining both models."""
+    def clear_prediction_cache(self) -> None:
+        """Drop all cached predictions, e.g. after retraining."""
+        with self.predictions_lock:
+            self.predictions_cache.clear()
+
+    def invalidate_route_predictions(self, route_id: int) -> None:
+        """Drop cached predictions for one route, for every preference set.
+        
+        Only this process's cache is affected; other workers keep serving the
+        route's cached predictions until they expire (up to the 1 hour TTL).
+        """
+        with self.predictions_lock:
+            # Keys are (model_generation, route_id, preferences)
+            for key in [key for key in self.predictions_cache.keys() if key[1] == route_id]:
+                self.predictions_cache.pop(key, None)
+
+    def predict_routes(self, routes: Sequence[Route], preferences: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Generate predictions for already-loaded routes with one call per model."""
+        if not routes:
+            return []
         try:
-            # Prepare features (redundant calls ensure both branches are using fresh data)
-            rf_features = self.rf_model.prepare_route_features(route)
-            ann_features = self.prepare_ann_features(route, preferences)
-            
             # Get predictions from the RF model (which provides route type, difficulty, etc.)
-            rf_predictions = self.rf_model.predict_route_properties(rf_features)
-            # Get quality score from the ANN model
-            ann_quality_score = float(self.ann_model.predict_route_quality(ann_features)[0][0])
+            rf_predictions = self.rf_model.predict_batch(routes)
+            # Get quality scores from the ANN model
+            ann_features = self.prepare_ann_features_batch(routes, preferences)
+            quality_scores = self.ann_model.predict_route_quality(ann_features)[:, 0]
             
-            predictions = {
-                'route_type': rf_predictions.get('route_type', 'unknown'),
-                'difficulty_score': rf_predictions.get('difficulty_score', 0.5),
-                'quality_score': ann_quality_score,
-                'confidence_score': rf_predictions.get('confidence_score', 0.0),
-                'prediction_timestamp': datetime.utcnow().isoformat(),
-                'model_version': self.model_version,
-                'is_fallback': False
-            }
-            return predictions
+            return [
+                {
+                    'route_type': rf_prediction.get('route_type', 'unknown'),
+                    'difficulty_score': rf_prediction.get('difficulty_score', 0.5),
+                    'quality_score': float(quality_score),
+                    'confidence_score': rf_prediction.get('confidence_score', 0.0),
+                    'prediction_timestamp': rf_prediction.get('prediction_timestamp') or utc_now_iso(),
+                    'model_version': self.model_version,
+                    'is_fallback': False
+                }
+                for rf_prediction, quality_score in zip(rf_predictions, quality_scores)
+            ]
             
         except Exception as e:
             logger.error(f"Error generating predictions: {str(e)}", exc_info=True)
-            return self.get_fallback_predictions()
+            return [self.get_fallback_predictions() for _ in routes]
+
+    def _generate_predictions(self, route: Route, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate predictions by combining both models."""
+        return self.predict_routes([route], preferences)[0]
     
     def prepare_ann_features(self, route: Route, user_preferences: Dict[str, Any]) -> np.ndarray:
         """Prepare features for the ANN model, including user preferences."""
-        features = {
-            'distance': float(route.distance),
-            'elevation_gain': float(route.elevation_gain) if route.elevation_gain else 0.0,
-            'traffic_level': self.get_traffic_score(user_preferences),
-            'surface_quality': self.get_surface_score(user_preferences),
-            'safety_score': self.get_safety_score(user_preferences)
-        }
-        return prepare_route_features(features)
+        return prepare_route_features(
+            route.distance,
+            route.elevation_gain or 0.0,
+            *self.get_preference_scores(user_preferences)
+        )
+    
+    def prepare_ann_features_batch(self, routes: Sequence[Route], user_preferences: Dict[str, Any]) -> np.ndarray:
+        """Prepare an (N, 5) ANN feature matrix for routes sharing one set of preferences."""
+        features = np.empty((len(routes), 5), dtype=np.float32)
+        traffic, surface, safety = self.get_preference_scores(user_preferences)
+        features[:, TRAFFIC_LEVEL] = traffic
+        features[:, SURFACE_QUALITY] = surface
+        features[:, SAFETY_SCORE] = safety
+        for i, route in enumerate(routes):
+            features[i, DISTANCE] = route.distance
+            features[i, ELEVATION_GAIN] = route.elevation_gain or 0.0
+        return features
+    
+    def get_preference_scores(self, preferences: Dict[str, Any]) -> Tuple[float, float, float]:
+        """Convert user preferences to (traffic, surface, safety) ANN feature scores."""
+        return _preference_scores(
+            preferences.get('traffic_preference', 'neutral'),
+            preferences.get('surface_preference', 'asphalt'),
+            bool(preferences.get('require_lighting')),
+            bool(preferences.get('require_sidewalks'))
+        )
     
     def get_traffic_score(self, preferences: Dict[str, Any]) -> float:
         """Convert traffic preferences to a numerical score."""
-        traffic_map = {'avoid': 0.0, 'neutral': 0.5}
-        return traffic_map.get(preferences.get('traffic_preference', 'neutral'), 0.5)
+        return self.get_preference_scores(preferences)[0]
     
     def get_surface_score(self, preferences: Dict[str, Any]) -> float:
         """Convert surface preferences to a numerical score."""
-        surface_map = {'asphalt': 1.0, 'dirt': 0.7, 'grass': 0.4}
-        return surface_map.get(preferences.get('surface_preference', 'asphalt'), 0.7)
+        return self.get_preference_scores(preferences)[1]
     
     def get_safety_score(self, preferences: Dict[str, Any]) -> float:
         """Calculate a safety score based on user preferences."""
-        base_score = 0.8  # Default safety score
-        if preferences.get('require_lighting'):
-            base_score += 0.1
-        if preferences.get('require_sidewalks'):
-            base_score += 0.1
-        return min(base_score, 1.0)
+        return self.get_preference_scores(preferences)[2]
     
     def get_fallback_predictions(self) -> Dict[str, Any]:
         """Return fallback predictions if model processing fails."""
@@ -126,7 +197,7 @@ class ModelCoordinator:
             'difficulty_score': 0.5,
             'quality_score': 0.5,
             'confidence_score': 0.0,
-            'prediction_timestamp': datetime.utcnow().isoformat(),
+            'prediction_timestamp': utc_now_iso(),
             'model_version': self.model_version,
             'is_fallback': True
         }
@@ -160,8 +231,10 @@ class ModelCoordinator:
                 logger.error("Training failed for one or both models")
                 return False
             
-            self.model_version = f"1.0.{int(datetime.utcnow().timestamp())}"
-            self.predictions_cache.clear()  # Clear the cache after training
+            self.model_version = f"1.0.{int(datetime.now(timezone.utc).timestamp())}"
+            # Bumping the generation also keeps in-flight predictions from older models out
+            self.model_generation += 1
+            self.clear_prediction_cache()
             
             logger.info("Models trained successfully")
             logger.info(f"ANN training metrics: {metrics}")
@@ -1,16 +1,19 @@
+from collections import defaultdict
 from datetime import datetime
 from enum import Enum
 from sqlalchemy import (
-    Column, Integer, String, Text, DECIMAL, TIMESTAMP, ForeignKey, 
-    CheckConstraint, Enum as SQLEnum, func, Index, Boolean, Float
+    Column, Integer, String, Text, TIMESTAMP, ForeignKey, 
+    CheckConstraint, Enum as SQLEnum, func, Index, Boolean, Float, Double, select, update, inspect, tuple_, or_, true
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import relationship, defer
 from sqlalchemy.ext.hybrid import hybrid_property
 from geoalchemy2 import Geometry
 from . import db
 import math
 import logging
-from typing import List, Optional, Dict, Any
+import numpy as np
+from typing import List, Optional, Dict, Any, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -55,9 +58,9 @@ class User(db.Model):
         return {
             'id': self.id,
             'email': self.email,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'last_login': self.last_login,
             'is_active': self.is_active,
             'preferences': [pref.to_dict() for pref in self.preferences]
         }
@@ -71,11 +74,13 @@ class Route(db.Model):
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
-    latitude = Column(DECIMAL(10, 8), nullable=False)
-    longitude = Column(DECIMAL(11, 8), nullable=False)
+    # Plain floats: these only feed float math and JSON, so skip Decimal conversions
+    latitude = Column(Double, nullable=False)
+    longitude = Column(Double, nullable=False)
+    # geoalchemy2 creates the spatial index for this column (spatial_index=True)
     location = Column(Geometry(geometry_type='POINT', srid=4326))
-    distance = Column(DECIMAL(6, 2), nullable=False)
-    elevation_gain = Column(DECIMAL(6, 2))
+    distance = Column(Float, nullable=False)
+    elevation_gain = Column(Float)
     surface_type = Column(
         SQLEnum(SurfacePreference),
         nullable=False,
@@ -86,47 +91,179 @@ class Route(db.Model):
     is_lit = Column(Boolean, default=False, server_default='0')
     difficulty_score = Column(Float, nullable=True)
     popularity_score = Column(Float, nullable=True)
+    # Denormalized AVG(feedback.rating), kept current by submit_feedback
+    avg_rating = Column(Float, nullable=True)
     created_at = Column(TIMESTAMP, default=datetime.utcnow, server_default=func.now())
     updated_at = Column(TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    feedback = relationship("Feedback", back_populates="route", cascade="all, delete-orphan")
+    feedback = relationship(
+        "Feedback", back_populates="route", cascade="all, delete-orphan",
+        order_by="Feedback.created_at.desc()"
+    )
     users = relationship("User", secondary="feedback", back_populates="routes")
 
     __table_args__ = (
-        Index('idx_route_location', 'latitude', 'longitude'),
+        # Lets search_nearby/search_routes evaluate their bbox, elevation, surface and
+        # rating filters from the index (index condition pushdown) before touching rows
+        Index('idx_route_search', 'latitude', 'longitude', 'distance', 'elevation_gain',
+              'surface_type', 'avg_rating'),
         Index('idx_route_distance', 'distance'),
         Index('idx_route_surface', 'surface_type'),
         Index('idx_route_difficulty', 'difficulty_score'),
         Index('idx_route_popularity', 'popularity_score'),
-        Index('idx_route_spatial', 'location', postgresql_using='gist'),
+        Index('idx_route_avg_rating', 'avg_rating'),
     )
 
+    @classmethod
+    def hydrate_feedback_stats(cls, routes: List['Route']) -> List['Route']:
+        """Load feedback counts and recent feedback for many routes in two queries.
+        
+        to_dict() then uses these instead of loading each route's feedback
+        collection, so serializing a page doesn't issue a query per route.
+        The average rating is read from the stored avg_rating column.
+        """
+        ids = [route.id for route in routes]
+        if not ids:
+            return routes
+
+        counts = dict(
+            db.session.query(Feedback.route_id, func.count(Feedback.id))
+            .filter(Feedback.route_id.in_(ids))
+            .group_by(Feedback.route_id)
+            .all()
+        )
+
+        # Rank each route's feedback newest first and keep the top 5
+        recency = func.row_number().over(
+            partition_by=Feedback.route_id,
+            order_by=Feedback.created_at.desc()
+        ).label('recency')
+        ranked = db.session.query(Feedback.id, recency).filter(Feedback.route_id.in_(ids)).subquery()
+        recent = defaultdict(list)
+        for feedback in (Feedback.query
+                         .join(ranked, Feedback.id == ranked.c.id)
+                         .filter(ranked.c.recency <= 5)
+                         .order_by(Feedback.route_id, ranked.c.recency)):
+            recent[feedback.route_id].append(feedback.to_dict())
+
+        for route in routes:
+            route._feedback_stats = (counts.get(route.id, 0), recent.get(route.id, []))
+        return routes
+
+    @classmethod
+    def get_detail_or_404(cls, route_id: int) -> 'Route':
+        """Load one route with its feedback stats for the detail views.
+        
+        The feedback count comes back as a column of the route query and the
+        recent feedback from a single LIMIT 5 query, so a detail view costs two
+        round trips in total.
+        """
+        feedback_count = (
+            select(func.count(Feedback.id))
+            .where(Feedback.route_id == cls.id)
+            .correlate_except(Feedback)
+            .scalar_subquery()
+        )
+        route, count = (
+            db.session.query(cls, feedback_count)
+            .filter(cls.id == route_id)
+            .first_or_404()
+        )
+        route._feedback_stats = (count, route.recent_feedback)
+        return route
+
     @hybrid_property
     def average_rating(self) -> Optional[float]:
-        """Calculate the average rating for the route."""
-        if not self.feedback:
-            return None
-        ratings = [f.rating for f in self.feedback]
-        return round(sum(ratings) / len(ratings), 2)
+        """The route's average rating, from the stored avg_rating column."""
+        return round(self.avg_rating, 2) if self.avg_rating is not None else None
+
+    @average_rating.expression
+    def average_rating(cls):
+        return cls.avg_rating
 
     @property
     def recent_feedback(self) -> List[Dict[str, Any]]:
         """Get the 5 most recent feedback entries."""
-        return [f.to_dict() for f in sorted(
-            self.feedback, 
-            key=lambda x: x.created_at, 
-            reverse=True
-        )[:5]]
+        stats = getattr(self, '_feedback_stats', None)
+        if stats is not None:
+            return stats[1]
+        # The collection is ordered newest first; if it isn't loaded yet, let the
+        # database pick the top 5 rather than loading every row
+        if 'feedback' not in inspect(self).unloaded:
+            return [f.to_dict() for f in self.feedback[:5]]
+        return [f.to_dict() for f in (Feedback.query
+                                      .filter(Feedback.route_id == self.id)
+                                      .order_by(Feedback.created_at.desc())
+                                      .limit(5))]
+
+    @classmethod
+    def within_radius(cls, latitude: float, longitude: float, max_distance: float):
+        """Return (distance_m, filters) for routes within `max_distance` km of a point.
+        
+        `filters` pairs a bounding box on the (latitude, longitude) index with an
+        exact great-circle cutoff in meters; `distance_m` can be used for ordering.
+        A box crossing the antimeridian is split into two longitude ranges, and
+        one reaching a pole doesn't restrict longitude at all.
+        """
+        lat_delta = max_distance / 111.195  # km per degree of latitude
+        lon_delta = lat_delta / max(math.cos(math.radians(latitude)), 1e-6)
+        lon_min, lon_max = longitude - lon_delta, longitude + lon_delta
+        if lon_delta >= 180.0 or abs(latitude) + lat_delta >= 90.0:
+            lon_filter = true()
+        elif lon_min < -180.0:
+            lon_filter = or_(cls.longitude >= lon_min + 360.0, cls.longitude <= lon_max)
+        elif lon_max > 180.0:
+            lon_filter = or_(cls.longitude >= lon_min, cls.longitude <= lon_max - 360.0)
+        else:
+            lon_filter = cls.longitude.between(lon_min, lon_max)
+        # Plain (longitude, latitude) points; ST_Distance_Sphere returns meters
+        distance_m = func.ST_Distance_Sphere(
+            func.Point(cls.longitude, cls.latitude),
+            func.Point(longitude, latitude)
+        )
+        return distance_m, (
+            cls.latitude.between(latitude - lat_delta, latitude + lat_delta),
+            lon_filter,
+            distance_m <= max_distance * 1000
+        )
+
+    @classmethod
+    def search_nearby(
+        cls,
+        latitude: float,
+        longitude: float,
+        max_distance: float,
+        route_type: Optional[str] = None,
+        elevation_preference: Optional[str] = None,
+        limit: int = 50
+    ) -> List['Route']:
+        """Find routes within `max_distance` km of a point, nearest first.
+        
+        A bounding box on the (latitude, longitude) index narrows the candidates;
+        MySQL's ST_Distance_Sphere then applies the exact great-circle cutoff, so
+        only matching rows are sent back. `route_type` is predicted rather than
+        stored, so it is not filtered on here.
+        """
+        distance_m, within = cls.within_radius(latitude, longitude, max_distance)
+        # to_dict() never reads the geometry, so don't fetch and decode it per row
+        query = cls.query.options(defer(cls.location)).filter(*within)
+        if elevation_preference == ElevationPreference.FLAT:
+            query = query.filter(cls.elevation_gain <= 100)
+        elif elevation_preference == ElevationPreference.MODERATE:
+            query = query.filter(cls.elevation_gain.between(100, 300))
+        elif elevation_preference == ElevationPreference.CHALLENGING:
+            query = query.filter(cls.elevation_gain > 300)
+
+        return query.order_by(distance_m).limit(limit).all()
+
+    @property
+    def feedback_count(self) -> int:
+        stats = getattr(self, '_feedback_stats', None)
+        return stats[0] if stats is not None else len(self.feedback)
 
     def calculate_difficulty_score(self) -> float:
         """Calculate route difficulty based on distance and elevation."""
-        try:
-            distance_score = min(float(self.distance) / 10, 1.0)
-            elevation_score = min(float(self.elevation_gain or 0) / 500, 1.0)
-            return round((elevation_score * 0.6) + (distance_score * 0.4), 2)
-        except Exception as e:
-            logger.error(f"Error calculating difficulty score: {e}")
-            return 0.5
+        return calculate_difficulty(self.distance, self.elevation_gain)
 
     def update_popularity_score(self):
         """Update route popularity based on feedback and views."""
@@ -145,10 +282,10 @@ class Route(db.Model):
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'latitude': float(self.latitude),
-            'longitude': float(self.longitude),
-            'distance': float(self.distance),
-            'elevation_gain': float(self.elevation_gain) if self.elevation_gain else None,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'distance': self.distance,
+            'elevation_gain': self.elevation_gain,
             'surface_type': self.surface_type.value,
             'has_sidewalks': self.has_sidewalks,
             'is_lit': self.is_lit,
@@ -156,9 +293,9 @@ class Route(db.Model):
             'popularity_score': self.popularity_score,
             'average_rating': self.average_rating,
             'recent_feedback': self.recent_feedback,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'feedback_count': len(self.feedback)
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'feedback_count': self.feedback_count
         }
 
     def __repr__(self):
@@ -205,7 +342,7 @@ class Preference(db.Model):
     user = relationship("User", back_populates="preferences")
 
     __table_args__ = (
-        Index('idx_preference_user', 'user_id'),
+        Index('idx_preference_user', 'user_id', unique=True),
     )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -217,8 +354,8 @@ class Preference(db.Model):
             'surface_preference': self.surface_preference.value,
             'traffic_preference': self.traffic_preference.value,
             'crowd_preference': self.crowd_preference.value,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
     def __repr__(self):
@@ -239,8 +376,10 @@ class Feedback(db.Model):
     user = relationship("User", back_populates="feedback")
 
     __table_args__ = (
-        Index('idx_feedback_route', 'route_id'),
+        # Covers the per-route AVG/COUNT(rating) aggregates without row lookups
+        Index('idx_feedback_route_rating', 'route_id', 'rating'),
         Index('idx_feedback_user', 'user_id'),
+        Index('idx_feedback_route_user', 'route_id', 'user_id', unique=True),
     )
 
     def to_dict(self) -> Dict[str, Any]:
@@ -250,8 +389,8 @@ class Feedback(db.Model):
             'user_id': self.user_id,
             'rating': self.rating,
             'comment': self.comment,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
     def __repr__(self):
@@ -262,15 +401,31 @@ from sqlalchemy import event
 @event.listens_for(Route, 'before_insert')
 @event.listens_for(Route, 'before_update')
 def validate_coordinates(mapper, connection, target):
-    if not (-90 <= float(target.latitude) <= 90):
+    if not (-90 <= target.latitude <= 90):
         raise ValueError("Latitude must be between -90 and 90")
-    if not (-180 <= float(target.longitude) <= 180):
+    if not (-180 <= target.longitude <= 180):
         raise ValueError("Longitude must be between -180 and 180")
     target.location = func.ST_SetSRID(
-        func.ST_MakePoint(float(target.longitude), float(target.latitude)),
+        func.ST_MakePoint(target.longitude, target.latitude),
         4326
     )
 
+@event.listens_for(Route, 'before_insert')
+@event.listens_for(Route, 'before_update')
+def set_difficulty_score(mapper, connection, target):
+    # Stored at write time so reads and filters use the column directly
+    target.difficulty_score = target.calculate_difficulty_score()
+
+def calculate_difficulty(distance: float, elevation_gain: Optional[float]) -> float:
+    """Difficulty in [0, 1] from distance (km) and elevation gain (m)."""
+    try:
+        distance_score = min(distance / 10, 1.0)
+        elevation_score = min((elevation_gain or 0) / 500, 1.0)
+        return round((elevation_score * 0.6) + (distance_score * 0.4), 2)
+    except Exception as e:
+        logger.error(f"Error calculating difficulty score: {e}")
+        return 0.5
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate the Haversine distance between two points on Earth."""
     try:
@@ -285,6 +440,19 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
         logger.error(f"Error calculating distance: {e}")
         return float('inf')
 
+def calculate_distance_batch(lat0, lon0, lats, lons) -> np.ndarray:
+    """Vectorized Haversine distances in km between points.
+    
+    Arguments broadcast, so this covers one point against many as well as
+    element-wise pairs (e.g. consecutive waypoints).
+    """
+    lat0 = np.radians(lat0)
+    lats = np.radians(lats)
+    dlat = lats - lat0
+    dlon = np.radians(lons) - np.radians(lon0)
+    a = np.sin(dlat * 0.5) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin(dlon * 0.5) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
 def search_routes(
     latitude: float,
     longitude: float,
@@ -292,19 +460,19 @@ def search_routes(
     elevation_preference: Optional[ElevationPreference] = None,
     surface_type: Optional[SurfacePreference] = None,
     min_rating: Optional[float] = None,
-    page: int = 1,
+    cursor: Optional[Tuple[float, int]] = None,
     per_page: int = 20
-) -> List[Route]:
-    """Search routes using a spatial query with optional filters and pagination."""
+) -> Tuple[List[Route], Optional[Tuple[float, int]]]:
+    """Search routes using a spatial query with optional filters and pagination.
+    
+    Pages are keyset-paginated on (distance in meters, id): pass the returned
+    cursor back to get the next page, which is None once results run out.
+    """
     try:
-        point = func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326)
-        query = Route.query.filter(
-            func.ST_DWithin(
-                Route.location,
-                point,
-                max_distance * 1000  # Convert km to meters
-            )
-        )
+        # Distances in meters on the sphere; a planar ST_DWithin on the SRID 4326
+        # geometry would compare degrees against meters
+        distance_m, within = Route.within_radius(latitude, longitude, max_distance)
+        query = Route.query.options(defer(Route.location)).filter(*within)
         
         # Apply elevation filter.
         if elevation_preference:
@@ -319,16 +487,22 @@ def search_routes(
         if surface_type:
             query = query.filter(Route.surface_type == surface_type)
             
-        # If filtering by minimum rating, join with feedback, group by Route ID, and apply HAVING.
+        # Filter on the stored average so no feedback has to be aggregated per search.
         if min_rating is not None:
-            query = query.outerjoin(Route.feedback).group_by(Route.id).having(func.avg(Feedback.rating) >= min_rating)
-        
-        query = query.order_by(
-            func.ST_Distance(Route.location, point),
-            Route.popularity_score.desc()
-        )
+            query = query.filter(Route.avg_rating >= min_rating)
         
-        return query.paginate(page=page, per_page=per_page, error_out=False).items
+        # Seek past the previous page instead of OFFSET-scanning it, and skip the
+        # COUNT(*) that paginate() would run
+        if cursor is not None:
+            query = query.filter(tuple_(distance_m, Route.id) > tuple(cursor))
+
+        rows = (query.add_columns(distance_m)
+                .order_by(distance_m, Route.id)
+                .limit(per_page)
+                .all())
+        routes = [route for route, _ in rows]
+        next_cursor = (rows[-1][1], rows[-1][0].id) if len(rows) == per_page else None
+        return routes, next_cursor
         
     except Exception as e:
         logger.error(f"Error searching routes: {e}")
@@ -345,24 +519,19 @@ def save_preferences(
 ) -> bool:
     """Save or update user preferences."""
     try:
-        existing = Preference.query.filter_by(user_id=user_id).first()
-        if existing:
-            existing.route_type = route_type
-            existing.elevation_preference = elevation_preference
-            existing.surface_preference = surface_preference
-            existing.traffic_preference = traffic_preference
-            existing.crowd_preference = crowd_preference
-        else:
-            new_pref = Preference(
-                user_id=user_id,
-                route_type=route_type,
-                elevation_preference=elevation_preference,
-                surface_preference=surface_preference,
-                traffic_preference=traffic_preference,
-                crowd_preference=crowd_preference
-            )
-            db.session.add(new_pref)
-        
+        values = dict(
+            route_type=route_type,
+            elevation_preference=elevation_preference,
+            surface_preference=surface_preference,
+            traffic_preference=traffic_preference,
+            crowd_preference=crowd_preference
+        )
+        # One upsert on the unique user_id instead of SELECT then INSERT/UPDATE
+        stmt = mysql_insert(Preference).values(user_id=user_id, **values)
+        # Reuse the inserted row's values rather than binding every column twice
+        db.session.execute(stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in (*values, 'updated_at')}
+        ))
         db.session.commit()
         return True
 
@@ -371,22 +540,30 @@ def save_preferences(
         db.session.rollback()
         raise
 
+def _avg_rating_subquery(route_id):
+    """AVG(feedback.rating) for a route id (or correlated column)."""
+    return (
+        select(func.avg(Feedback.rating))
+        .where(Feedback.route_id == route_id)
+        .scalar_subquery()
+    )
+
 def submit_feedback(route_id, user_id, rating, comment=None):
     """Submit or update route feedback."""
     try:
-        existing = Feedback.query.filter_by(route_id=route_id, user_id=user_id).first()
-        if existing:
-            existing.rating = rating
-            existing.comment = comment
-        else:
-            feedback = Feedback(
-                route_id=route_id,
-                user_id=user_id,
-                rating=rating,
-                comment=comment
-            )
-            db.session.add(feedback)
-            
+        values = dict(rating=rating, comment=comment)
+        # One upsert on the unique (route_id, user_id) instead of SELECT then INSERT/UPDATE
+        stmt = mysql_insert(Feedback).values(route_id=route_id, user_id=user_id, **values)
+        db.session.execute(stmt.on_duplicate_key_update(
+            {column: stmt.inserted[column] for column in (*values, 'updated_at')}
+        ))
+        # Refresh the route's stored average in the same transaction; a new
+        # rating isn't an edit to the route, so updated_at stays as is
+        db.session.execute(
+            update(Route)
+            .where(Route.id == route_id)
+            .values(avg_rating=_avg_rating_subquery(route_id), updated_at=Route.updated_at)
+        )
         db.session.commit()
         return True
 
@@ -398,8 +575,8 @@ def submit_feedback(route_id, user_id, rating, comment=None):
 def get_route_details(route_id):
     """Retrieve detailed route information."""
     try:
-        route = Route.query.get_or_404(route_id)
-        return route.to_dict()
+        # Count and recent feedback come from SQL rather than loading every feedback row
+        return Route.get_detail_or_404(route_id).to_dict()
     except Exception as e:
         logger.error(f"Error getting route details: {e}")
         db.session.rollback()
@@ -1,9 +0,0 @@
-# app/routes.py
-from .utils import (
-    generate_and_store_routes,
-    generate_routes,
-    calculate_route_distance,
-    haversine_distance,
-    get_route_description,
-    store_routes
-)
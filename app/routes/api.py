@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, abort
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from marshmallow import Schema, fields, validate, ValidationError
 from bleach import clean
-from app.models import db, Route, Preference, Feedback
+from werkzeug.exceptions import HTTPException
+from app import get_model_coordinator
+from app.models import Route, Preference, submit_feedback as save_feedback
+from cachetools import TTLCache
+from cachetools.keys import hashkey
 from functools import wraps
 from typing import Dict, Any
 import logging
+import threading
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 logger = logging.getLogger(__name__)
@@ -31,6 +36,14 @@ class FeedbackSchema(Schema):
     rating = fields.Integer(required=True, validate=validate.Range(min=1, max=5))
     comment = fields.String(validate=validate.Length(max=1000))
 
+# Recent search responses, per process. Cache keys snap coordinates to ~110 m
+# (3 decimal places) so nearby users share entries; the query itself uses the
+# exact coordinates. Feedback clears this process's cache, and the TTL bounds
+# how long other workers can serve stale results.
+SEARCH_CACHE_TTL = 60
+_search_cache = TTLCache(maxsize=1024, ttl=SEARCH_CACHE_TTL)
+_search_lock = threading.Lock()
+
 search_schema = RouteSearchSchema()
 feedback_schema = FeedbackSchema()
 
@@ -44,6 +57,8 @@ def handle_errors(f):
             return f(*args, **kwargs)
         except ValidationError as e:
             return jsonify({'error': 'Validation error', 'details': e.messages}), 400
+        except HTTPException as e:
+            return jsonify({'error': e.description}), e.code
         except Exception as e:
             logger.error(f"Error in {f.__name__}: {str(e)}")
             return jsonify({
@@ -59,21 +74,38 @@ def search_routes():
     # Validate and load the query parameters.
     params = search_schema.load(request.args)
     user_preferences = get_user_preferences()
-    model_coordinator = current_app.model_coordinator
+    model_coordinator = require_model_coordinator()
+
+    key_params = dict(params, latitude=round(params['latitude'], 3),
+                      longitude=round(params['longitude'], 3))
+    cache_key = hashkey(
+        model_coordinator.model_generation,
+        tuple(sorted(key_params.items())),
+        tuple(sorted(user_preferences.items()))
+    )
+    with _search_lock:
+        cached = _search_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached)
 
     # Find nearby routes based on the search parameters.
     routes = Route.search_nearby(**params)
+    # Load ratings and recent feedback for the whole page up front
+    Route.hydrate_feedback_stats(routes)
+    # Score the whole page with one call per model instead of once per route
+    predictions = model_coordinator.predict_routes(routes, user_preferences)
     enriched_routes = []
-    for route in routes:
+    for route, route_predictions in zip(routes, predictions):
         try:
-            predictions = model_coordinator.get_route_predictions(route.id, user_preferences)
             route_data = route.to_dict()
-            route_data.update(predictions)
+            route_data.update(route_predictions)
             enriched_routes.append(route_data)
         except Exception as e:
             logger.error(f"Error enriching route {route.id}: {str(e)}")
             continue
 
+    with _search_lock:
+        _search_cache[cache_key] = enriched_routes
     return jsonify(enriched_routes)
 
 @bp.route('/routes/<int:route_id>', methods=['GET'])
@@ -84,9 +116,9 @@ def get_route_details(route_id: int):
     if route_id < 1:
         return jsonify({'error': 'Invalid route ID'}), 400
 
-    route = Route.query.get_or_404(route_id)
+    route = Route.get_detail_or_404(route_id)
     user_preferences = get_user_preferences()
-    model_coordinator = current_app.model_coordinator
+    model_coordinator = require_model_coordinator()
 
     predictions = model_coordinator.get_route_predictions(route_id, user_preferences)
     route_data = route.to_dict()
@@ -103,22 +135,30 @@ def submit_feedback():
     if 'comment' in data:
         data['comment'] = sanitize_text(data['comment'])
 
-    feedback = Feedback(
+    # Upsert so a user re-rating a route updates their existing feedback
+    save_feedback(
         route_id=data['route_id'],
         user_id=data['user_id'],
         rating=data['rating'],
         comment=data.get('comment')
     )
-    db.session.add(feedback)
-    db.session.commit()
 
-    model_coordinator = current_app.model_coordinator
-    # Clear any cached predictions if the method supports it.
-    if hasattr(model_coordinator.get_route_predictions, "cache_clear"):
-        model_coordinator.get_route_predictions.cache_clear()
+    # New feedback can change ratings and predictions, so drop any cached ones.
+    with _search_lock:
+        _search_cache.clear()
+    model_coordinator = get_model_coordinator(timeout=0)
+    if model_coordinator:
+        model_coordinator.invalidate_route_predictions(data['route_id'])
 
     return jsonify({'message': 'Feedback submitted successfully'})
 
+def require_model_coordinator():
+    """Return the model coordinator or abort with 503 while models are unavailable."""
+    model_coordinator = get_model_coordinator()
+    if model_coordinator is None:
+        abort(503, description="Prediction models are not available yet")
+    return model_coordinator
+
 def get_user_preferences() -> Dict[str, Any]:
     """Return current user preferences or default values."""
     return {
@@ -1,4 +1,5 @@
 from flask import Blueprint, render_template, request, redirect, url_for, current_app, session
+from app import get_model_coordinator
 from app.models import get_route_details, Preference
 import logging
 
@@ -17,8 +18,8 @@ def search_page():
         if not google_maps_api_key:
             current_app.logger.warning('Google Maps API key not configured')
 
-        # Use the existing model coordinator to determine if AI is enabled
-        ai_enabled = current_app.model_coordinator is not None
+        # AI is enabled once the background warmup has produced a coordinator
+        ai_enabled = get_model_coordinator(timeout=0) is not None
 
         # Collect search parameters from the query string
         template_vars = {
@@ -96,7 +97,7 @@ def prepare_ai_analysis(route_data, user_preferences=None):
     """
     try:
         # Use the model coordinator initialized in app/__init__.py
-        coordinator = current_app.model_coordinator
+        coordinator = get_model_coordinator()
         if not coordinator:
             logger.error("Model coordinator not initialized")
             return None
@@ -112,7 +113,8 @@ def prepare_ai_analysis(route_data, user_preferences=None):
             return None
 
         # Get predictions from the coordinator (e.g., route type and difficulty)
-        predictions = coordinator.get_route_predictions(route_id, user_preferences or {})
+        # Copy so adding route_features doesn't modify the cached predictions
+        predictions = dict(coordinator.get_route_predictions(route_id, user_preferences or {}))
 
         # Build a list of descriptive features based on the predictions and route details
         features = []
@@ -1,24 +1,82 @@
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import random
+import threading
+import time
+from cachetools import TTLCache
 from math import radians, cos, sin, asin, sqrt, pi
 from flask import current_app
-from . import mysql
+from sqlalchemy import text
+from . import db
+from .models import calculate_distance_batch, calculate_difficulty
 
-def generate_and_store_routes(location, proximity, desired_distance):
-    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-    geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={location}&key={api_key}"
-    response = requests.get(geocode_url)
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+# Shared keep-alive session so repeated geocode lookups skip the TLS handshake
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504))
+))
+
+# Geocode results keyed on the normalized address. Addresses the API rejects are
+# remembered briefly too, so repeated bad input doesn't hit Google every time.
+_GEOCODE_CACHE = TTLCache(maxsize=10_000, ttl=24 * 3600)
+_GEOCODE_MISSES = TTLCache(maxsize=1024, ttl=300)
+_GEOCODE_LOCK = threading.Lock()
+# After OVER_QUERY_LIMIT, uncached lookups are skipped until this monotonic time
+GEOCODE_THROTTLE_SECONDS = 30
+_geocode_throttled_until = 0.0
+
+def geocode_location(location):
+    """Return (lat, lng) for an address, or None if it can't be geocoded."""
+    global _geocode_throttled_until
+    key = ' '.join(location.lower().split())
+    with _GEOCODE_LOCK:
+        if key in _GEOCODE_CACHE:
+            return _GEOCODE_CACHE[key]
+        if key in _GEOCODE_MISSES or time.monotonic() < _geocode_throttled_until:
+            return None
+
+    response = _SESSION.get(
+        GEOCODE_URL,
+        params={'address': key, 'key': os.getenv('GOOGLE_MAPS_API_KEY')},
+        timeout=(3.05, 30)
+    )
     if response.status_code != 200:
+        # Transient failure; don't cache it
         current_app.logger.error("Error fetching geocode data; status code: " + str(response.status_code))
+        return None
+    location_data = orjson.loads(response.content)
+    status = location_data.get('status')
+    if status != 'OK':
+        current_app.logger.error("Geocode API error: " + (status or 'Unknown error'))
+        if status in ('ZERO_RESULTS', 'INVALID_REQUEST'):
+            with _GEOCODE_LOCK:
+                _GEOCODE_MISSES[key] = True
+        elif status == 'OVER_QUERY_LIMIT':
+            # The quota applies to every address, so back off all lookups briefly
+            with _GEOCODE_LOCK:
+                _geocode_throttled_until = time.monotonic() + GEOCODE_THROTTLE_SECONDS
+        return None
+
+    point = location_data['results'][0]['geometry']['location']
+    coordinates = (point['lat'], point['lng'])
+    with _GEOCODE_LOCK:
+        _GEOCODE_CACHE[key] = coordinates
+    return coordinates
+
+def generate_and_store_routes(location, proximity, desired_distance):
+    coordinates = geocode_location(location)
+    if coordinates is None:
         return []
-    location_data = response.json()
-    if location_data.get('status') != 'OK':
-        current_app.logger.error("Geocode API error: " + location_data.get('status', 'Unknown error'))
-        return []
-    loc_lat = location_data['results'][0]['geometry']['location']['lat']
-    loc_lng = location_data['results'][0]['geometry']['location']['lng']
-    
+    loc_lat, loc_lng = coordinates
+
     routes = generate_routes(loc_lat, loc_lng, proximity, desired_distance)
     store_routes(routes)
     return routes
@@ -26,33 +84,33 @@ def generate_and_store_routes(location, proximity, desired_distance):
 def generate_routes(lat, lng, proximity, distance_km):
     routes = []
     num_points = 8
+    # Every route is the same loop around the start point, so build its
+    # waypoints and length once, as arrays
+    radius = distance_km * 1000 / (2 * pi)
+    angles = np.linspace(0, 2 * pi, num_points, endpoint=False)
+    waypoints = np.column_stack((
+        lat + (radius * np.cos(angles)) / 111111,
+        lng + (radius * np.sin(angles)) / (111111 * cos(radians(lat)))
+    ))
+    actual_distance = calculate_route_distance(waypoints)
     for i in range(5):
-        start_lat, start_lng = lat, lng
-        waypoints = []
-        radius = distance_km * 1000 / (2 * pi)
-        for j in range(num_points):
-            angle = (2 * pi * j) / num_points
-            point_lat = start_lat + (radius * cos(angle)) / 111111
-            point_lng = start_lng + (radius * sin(angle)) / (111111 * cos(radians(start_lat)))
-            waypoints.append((point_lat, point_lng))
-        actual_distance = calculate_route_distance(waypoints)
         routes.append({
             'name': f'Route {i+1}',
             'description': f'{distance_km}km {get_route_description()}',
-            'latitude': start_lat,
-            'longitude': start_lng,
+            'latitude': lat,
+            'longitude': lng,
             'distance': actual_distance,
-            'waypoints': waypoints
+            'waypoints': waypoints.tolist()
         })
     return routes
 
 def calculate_route_distance(waypoints):
-    total_distance = 0
-    for i in range(len(waypoints) - 1):
-        lat1, lon1 = waypoints[i]
-        lat2, lon2 = waypoints[i + 1]
-        total_distance += haversine_distance(lat1, lon1, lat2, lon2)
-    return total_distance
+    if len(waypoints) < 2:
+        return 0
+    # Distances between all consecutive waypoints in one vectorized pass
+    points = np.asarray(waypoints, dtype=np.float64)
+    lats, lons = points[:, 0], points[:, 1]
+    return float(calculate_distance_batch(lats[:-1], lons[:-1], lats[1:], lons[1:]).sum())
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     R = 6371  # Earth's radius in kilometers
@@ -69,13 +127,22 @@ def get_route_description():
     return f"{random.choice(terrains)} route with {random.choice(features)}"
 
 def store_routes(routes):
-    cursor = mysql.connection.cursor()
-    for route in routes:
-        cursor.execute(
-            """INSERT INTO Routes (name, description, latitude, longitude, distance) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            (route['name'], route['description'], route['latitude'], 
-             route['longitude'], route['distance'])
-        )
-    mysql.connection.commit()
-    cursor.close()
+    # Use the app's pooled SQLAlchemy session rather than a separate MySQLdb connection
+    if not routes:
+        return
+    # Raw INSERTs skip the ORM write hooks, so fill in difficulty_score here
+    params = [
+        {
+            **{key: route[key] for key in ('name', 'description', 'latitude', 'longitude', 'distance')},
+            'difficulty_score': calculate_difficulty(route['distance'], None)
+        }
+        for route in routes
+    ]
+    # A list of parameter sets runs as one executemany, which MySQLdb sends as a
+    # single multi-row INSERT
+    db.session.execute(
+        text("""INSERT INTO routes (name, description, latitude, longitude, distance, difficulty_score) 
+                VALUES (:name, :description, :latitude, :longitude, :distance, :difficulty_score)"""),
+        params
+    )
+    db.session.commit()
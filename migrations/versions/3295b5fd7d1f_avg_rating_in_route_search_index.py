@@ -0,0 +1,28 @@
+"""add avg_rating to the route search index
+
+Revision ID: 3295b5fd7d1f
+Revises: 48e3e7d5c0cc
+Create Date: 2026-10-15 23:57:48.660154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3295b5fd7d1f'
+down_revision = '48e3e7d5c0cc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.drop_index('idx_route_search')
+        batch_op.create_index('idx_route_search', ['latitude', 'longitude', 'distance', 'elevation_gain', 'surface_type', 'avg_rating'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.drop_index('idx_route_search')
+        batch_op.create_index('idx_route_search', ['latitude', 'longitude', 'distance', 'elevation_gain', 'surface_type'], unique=False)
@@ -0,0 +1,50 @@
+"""one feedback row per route and user, one preference row per user
+
+Revision ID: 3c8d9261873a
+Revises: 861080c1e51b
+Create Date: 2026-10-15 23:24:51.602317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8d9261873a'
+down_revision = '861080c1e51b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Feedback and preferences used to be inserted on every submission; keep
+    # only the latest row of each so the unique indexes can be built
+    op.execute(
+        "DELETE older FROM feedback AS older "
+        "JOIN feedback AS newer ON newer.route_id = older.route_id "
+        "AND newer.user_id = older.user_id AND newer.id > older.id"
+    )
+    op.execute(
+        "DELETE older FROM preferences AS older "
+        "JOIN preferences AS newer ON newer.user_id = older.user_id "
+        "AND newer.id > older.id"
+    )
+
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_index('idx_feedback_route_user', ['route_id', 'user_id'], unique=True)
+
+    # The user_id foreign key needs an index at all times, so swap it in one statement
+    op.execute(
+        "ALTER TABLE preferences DROP INDEX idx_preference_user, "
+        "ADD UNIQUE INDEX idx_preference_user (user_id)"
+    )
+
+
+def downgrade():
+    op.execute(
+        "ALTER TABLE preferences DROP INDEX idx_preference_user, "
+        "ADD INDEX idx_preference_user (user_id)"
+    )
+
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.drop_index('idx_feedback_route_user')
@@ -0,0 +1,56 @@
+"""store route coordinates and distances as floats
+
+Revision ID: 3da63fefaba4
+Revises: 3c8d9261873a
+Create Date: 2026-10-15 23:31:17.840255
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3da63fefaba4'
+down_revision = '3c8d9261873a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.alter_column('latitude',
+               existing_type=sa.DECIMAL(precision=10, scale=8),
+               type_=sa.Double(),
+               existing_nullable=False)
+        batch_op.alter_column('longitude',
+               existing_type=sa.DECIMAL(precision=11, scale=8),
+               type_=sa.Double(),
+               existing_nullable=False)
+        batch_op.alter_column('distance',
+               existing_type=sa.DECIMAL(precision=6, scale=2),
+               type_=sa.Float(),
+               existing_nullable=False)
+        batch_op.alter_column('elevation_gain',
+               existing_type=sa.DECIMAL(precision=6, scale=2),
+               type_=sa.Float(),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.alter_column('elevation_gain',
+               existing_type=sa.Float(),
+               type_=sa.DECIMAL(precision=6, scale=2),
+               existing_nullable=True)
+        batch_op.alter_column('distance',
+               existing_type=sa.Float(),
+               type_=sa.DECIMAL(precision=6, scale=2),
+               existing_nullable=False)
+        batch_op.alter_column('longitude',
+               existing_type=sa.Double(),
+               type_=sa.DECIMAL(precision=11, scale=8),
+               existing_nullable=False)
+        batch_op.alter_column('latitude',
+               existing_type=sa.Double(),
+               type_=sa.DECIMAL(precision=10, scale=8),
+               existing_nullable=False)
@@ -0,0 +1,27 @@
+"""drop idx_route_location
+
+Revision ID: 3eb92e278833
+Revises: 3295b5fd7d1f
+Create Date: 2026-10-16 00:01:12.384529
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3eb92e278833'
+down_revision = '3295b5fd7d1f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (latitude, longitude) is the leading prefix of idx_route_search
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.drop_index('idx_route_location')
+
+
+def downgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.create_index('idx_route_location', ['latitude', 'longitude'], unique=False)
@@ -0,0 +1,29 @@
+"""fill in difficulty_score for routes stored without one
+
+Revision ID: 48e3e7d5c0cc
+Revises: b0502c56ac83
+Create Date: 2026-10-15 23:53:26.417759
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '48e3e7d5c0cc'
+down_revision = 'b0502c56ac83'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same formula as models.calculate_difficulty, which runs on every write now
+    op.execute(
+        "UPDATE routes SET difficulty_score = ROUND("
+        "LEAST(COALESCE(elevation_gain, 0) / 500, 1) * 0.6 + LEAST(distance / 10, 1) * 0.4, 2) "
+        "WHERE difficulty_score IS NULL"
+    )
+
+
+def downgrade():
+    pass
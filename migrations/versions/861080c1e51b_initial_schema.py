@@ -0,0 +1,95 @@
+"""initial schema
+
+Revision ID: 861080c1e51b
+Revises:
+Create Date: 2026-10-15 23:10:04.118522
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from geoalchemy2 import Geometry
+
+
+# revision identifiers, used by Alembic.
+revision = '861080c1e51b'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('last_login', sa.TIMESTAMP(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), server_default='1', nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    # geoalchemy2 adds the SPATIAL index on location when the table is created
+    op.create_table('routes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('latitude', sa.DECIMAL(precision=10, scale=8), nullable=False),
+    sa.Column('longitude', sa.DECIMAL(precision=11, scale=8), nullable=False),
+    sa.Column('location', Geometry(geometry_type='POINT', srid=4326), nullable=True),
+    sa.Column('distance', sa.DECIMAL(precision=6, scale=2), nullable=False),
+    sa.Column('elevation_gain', sa.DECIMAL(precision=6, scale=2), nullable=True),
+    sa.Column('surface_type', sa.Enum('ASPHALT', 'DIRT', 'GRASS', name='surfacepreference'), server_default='asphalt', nullable=False),
+    sa.Column('has_sidewalks', sa.Boolean(), server_default='0', nullable=True),
+    sa.Column('is_lit', sa.Boolean(), server_default='0', nullable=True),
+    sa.Column('difficulty_score', sa.Float(), nullable=True),
+    sa.Column('popularity_score', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.create_index('idx_route_difficulty', ['difficulty_score'], unique=False)
+        batch_op.create_index('idx_route_distance', ['distance'], unique=False)
+        batch_op.create_index('idx_route_location', ['latitude', 'longitude'], unique=False)
+        batch_op.create_index('idx_route_popularity', ['popularity_score'], unique=False)
+        batch_op.create_index('idx_route_surface', ['surface_type'], unique=False)
+
+    op.create_table('feedback',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('route_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('rating', sa.Integer(), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+    sa.CheckConstraint('rating >= 1 AND rating <= 5'),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_index('idx_feedback_route', ['route_id'], unique=False)
+        batch_op.create_index('idx_feedback_user', ['user_id'], unique=False)
+
+    op.create_table('preferences',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('route_type', sa.Enum('ROAD', 'TRAIL', 'MIXED', name='routetype'), server_default='mixed', nullable=False),
+    sa.Column('elevation_preference', sa.Enum('FLAT', 'MODERATE', 'CHALLENGING', name='elevationpreference'), server_default='moderate', nullable=False),
+    sa.Column('surface_preference', sa.Enum('ASPHALT', 'DIRT', 'GRASS', name='surfacepreference'), server_default='asphalt', nullable=False),
+    sa.Column('traffic_preference', sa.Enum('AVOID', 'NEUTRAL', name='trafficpreference'), server_default='neutral', nullable=False),
+    sa.Column('crowd_preference', sa.Enum('QUIET', 'SOCIAL', name='crowdpreference'), server_default='quiet', nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('preferences', schema=None) as batch_op:
+        batch_op.create_index('idx_preference_user', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_table('preferences')
+    op.drop_table('feedback')
+    op.drop_table('routes')
+    op.drop_table('users')
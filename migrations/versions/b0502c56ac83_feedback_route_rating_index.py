@@ -0,0 +1,30 @@
+"""cover feedback rating aggregates with (route_id, rating)
+
+Revision ID: b0502c56ac83
+Revises: e7257d1ce348
+Create Date: 2026-10-15 23:48:33.906412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b0502c56ac83'
+down_revision = 'e7257d1ce348'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # idx_feedback_route is a prefix of idx_feedback_route_rating and
+    # idx_feedback_route_user, which also serve the route_id foreign key
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_index('idx_feedback_route_rating', ['route_id', 'rating'], unique=False)
+        batch_op.drop_index('idx_feedback_route')
+
+
+def downgrade():
+    with op.batch_alter_table('feedback', schema=None) as batch_op:
+        batch_op.create_index('idx_feedback_route', ['route_id'], unique=False)
+        batch_op.drop_index('idx_feedback_route_rating')
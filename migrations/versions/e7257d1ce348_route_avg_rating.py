@@ -0,0 +1,35 @@
+"""store each route's average rating
+
+Revision ID: e7257d1ce348
+Revises: ec6a7ad2aa2f
+Create Date: 2026-10-15 23:42:09.531870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7257d1ce348'
+down_revision = 'ec6a7ad2aa2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avg_rating', sa.Float(), nullable=True))
+        batch_op.create_index('idx_route_avg_rating', ['avg_rating'], unique=False)
+
+    # Fill in the average for routes that already have feedback; updated_at is
+    # left alone since the routes themselves didn't change
+    op.execute(
+        "UPDATE routes SET avg_rating = "
+        "(SELECT AVG(feedback.rating) FROM feedback WHERE feedback.route_id = routes.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.drop_index('idx_route_avg_rating')
+        batch_op.drop_column('avg_rating')
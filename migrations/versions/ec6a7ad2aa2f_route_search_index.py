@@ -0,0 +1,26 @@
+"""composite index for the route search filters
+
+Revision ID: ec6a7ad2aa2f
+Revises: 3da63fefaba4
+Create Date: 2026-10-15 23:36:42.275903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ec6a7ad2aa2f'
+down_revision = '3da63fefaba4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.create_index('idx_route_search', ['latitude', 'longitude', 'distance', 'elevation_gain', 'surface_type'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('routes', schema=None) as batch_op:
+        batch_op.drop_index('idx_route_search')
@@ -1,6 +1,5 @@
 import logging
 from app import create_app
-from app.ml.model_coordinator import ModelCoordinator
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,13 +14,8 @@ logger = logging.getLogger(__name__)
 
 def init_application():
     try:
-        app = create_app()
-        with app.app_context():
-            coordinator = ModelCoordinator()
-            if not coordinator.initialize_models():
-                logger.warning("ML models initialization failed - will use fallback predictions")
-            app.model_coordinator = coordinator
-        return app
+        # create_app starts the model coordinator warmup in the background
+        return create_app()
     except Exception as e:
         logger.error(f"Failed to initialize application: {e}")
         raise
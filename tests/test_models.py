@@ -1,16 +1,21 @@
 # tests/test_models.py
 
 import os
+import shutil
 import numpy as np
 import pandas as pd
 import pytest
+import threading
 from unittest.mock import MagicMock, patch
 from flask import Flask
 from datetime import datetime
 from app.ml.model_coordinator import ModelCoordinator
+from app.ml import ai_model
 from app.ml.ai_model import PathfinderAI
+from app.ml.config import ModelConfig
 from app.ml.ann_model import PathfinderANN, prepare_route_features
 from tests.config import TestConfig
+import app as app_package
 import logging
 
 # Set up logging
@@ -31,6 +36,16 @@ def setup_test_environment():
     yield
     TestConfig.cleanup()
 
+@pytest.fixture(autouse=True)
+def rf_model_path(tmp_path, monkeypatch):
+    """Load and save the RF model from a per-test copy, not the committed file"""
+    model_path = tmp_path / os.path.basename(ModelConfig.RF_MODEL_PATH)
+    if os.path.exists(ModelConfig.RF_MODEL_PATH):
+        shutil.copy(ModelConfig.RF_MODEL_PATH, model_path)
+    monkeypatch.setattr(ModelConfig, 'RF_MODEL_PATH', str(model_path))
+    monkeypatch.setattr(ai_model, '_MODEL_SINGLETON', None)
+    return model_path
+
 @pytest.fixture
 def app():
     """Create test Flask application"""
@@ -124,6 +139,17 @@ def diverse_test_routes():
         }
     ]
 
+@pytest.fixture
+def mock_routes(diverse_test_routes):
+    """Create mock Route objects from the diverse test routes"""
+    routes = []
+    for route_data in diverse_test_routes:
+        route = MagicMock()
+        for key, value in route_data.items():
+            setattr(route, key, value)
+        routes.append(route)
+    return routes
+
 class TestANNModel:
     """Test suite for PathfinderANN model"""
     
@@ -145,7 +171,7 @@ class TestANNModel:
 
     def test_feature_preparation(self, sample_route_data):
         """Test ANN feature preparation"""
-        features = prepare_route_features(sample_route_data)
+        features = prepare_route_features(**sample_route_data)
         assert isinstance(features, np.ndarray)
         assert features.shape == (1, 5)
         assert np.all(np.isfinite(features))
@@ -169,6 +195,22 @@ class TestANNModel:
         assert 0 <= predictions[0][0] <= 1
         logger.info("Training and prediction test passed")
 
+    def test_folded_scaler_matches_pipeline(self, sample_training_data):
+        """Test that inference with the folded scaler matches scaler + model"""
+        model = PathfinderANN()
+        success, _ = model.train(
+            sample_training_data['ann_features'],
+            sample_training_data['ann_labels']
+        )
+        assert success is True
+        
+        test_features = np.random.uniform(0, 1, (10, 5))
+        expected = np.clip(
+            model.model.predict(model.scaler.transform(test_features)), 0, 1
+        ).reshape(-1, 1)
+        predictions = model.predict_route_quality(test_features)
+        np.testing.assert_allclose(predictions, expected, rtol=1e-4, atol=1e-5)
+
     def test_model_save_load(self, sample_training_data):
         """Test model saving and loading"""
         model = PathfinderANN()
@@ -215,7 +257,7 @@ class TestModelCoordinator:
             }
             
             with patch('app.models.Route.query') as mock_query:
-                mock_query.get.return_value = mock_route
+                mock_query.with_entities.return_value.filter.return_value.first.return_value = mock_route
                 predictions = coordinator.get_route_predictions(1, preferences)
             
             assert isinstance(predictions, dict)
@@ -224,12 +266,46 @@ class TestModelCoordinator:
             assert not predictions.get('is_fallback', False)
             logger.info("Prediction pipeline test passed")
 
+    def test_batch_route_predictions(self, app, mock_routes):
+        """Test batched coordinator predictions match per-route model predictions"""
+        with app.app_context():
+            coordinator = ModelCoordinator()
+            assert coordinator.initialize_models()
+            
+            preferences = {
+                'traffic_preference': 'avoid',
+                'surface_preference': 'dirt',
+                'require_lighting': True,
+                'require_sidewalks': False
+            }
+            
+            batch_predictions = coordinator.predict_routes(mock_routes, preferences)
+            assert len(batch_predictions) == len(mock_routes)
+            
+            for mock_route, batch_pred in zip(mock_routes, batch_predictions):
+                # Reference values from each model's single-route path
+                rf_pred = coordinator.rf_model.predict_route_properties(
+                    coordinator.rf_model.prepare_route_features(mock_route)
+                )
+                quality = coordinator.ann_model.predict_route_quality(
+                    coordinator.prepare_ann_features(mock_route, preferences)
+                )[0, 0]
+                assert not batch_pred['is_fallback']
+                assert batch_pred['route_type'] == rf_pred['route_type']
+                assert abs(batch_pred['difficulty_score'] - rf_pred['difficulty_score']) < 1e-4
+                assert abs(batch_pred['quality_score'] - float(quality)) < 1e-6
+                assert 0 <= batch_pred['quality_score'] <= 1
+            logger.info("Batch route prediction test passed")
+
     def test_model_training(self, app, sample_training_data):
         """Test coordinator model training"""
         with app.app_context():
             coordinator = ModelCoordinator()
+            coordinator.predictions_cache[(0, 1, ())] = {'route_type': 'stale'}
             success = coordinator.update_models(sample_training_data)
             assert success is True
+            assert coordinator.model_generation == 1
+            assert len(coordinator.predictions_cache) == 0
             logger.info("Coordinator training test passed")
 
     def test_fallback_behavior(self, app):
@@ -265,7 +341,7 @@ class TestPredictions:
                 }
                 
                 with patch('app.models.Route.query') as mock_query:
-                    mock_query.get.return_value = mock_route
+                    mock_query.with_entities.return_value.filter.return_value.first.return_value = mock_route
                     predictions = coordinator.get_route_predictions(
                         route_data['id'], 
                         preferences
@@ -299,7 +375,7 @@ class TestPredictions:
             # Make multiple predictions for the same route
             predictions = []
             with patch('app.models.Route.query') as mock_query:
-                mock_query.get.return_value = mock_route
+                mock_query.with_entities.return_value.filter.return_value.first.return_value = mock_route
                 for _ in range(3):
                     pred = coordinator.get_route_predictions(1, preferences)
                     predictions.append(pred)
@@ -310,6 +386,77 @@ class TestPredictions:
                 assert abs(predictions[i]['difficulty_score'] - predictions[0]['difficulty_score']) < 1e-6
                 assert abs(predictions[i]['quality_score'] - predictions[0]['quality_score']) < 1e-6
 
+    def test_invalidate_route_predictions(self, app, mock_route):
+        """Test that invalidating one route keeps other routes' cached predictions"""
+        with app.app_context():
+            coordinator = ModelCoordinator()
+            assert coordinator.initialize_models()
+
+            preferences = {'traffic_preference': 'neutral'}
+            with patch('app.models.Route.query') as mock_query:
+                mock_query.with_entities.return_value.filter.return_value.first.return_value = mock_route
+                coordinator.get_route_predictions(1, preferences)
+                coordinator.get_route_predictions(2, preferences)
+            assert len(coordinator.predictions_cache) == 2
+
+            coordinator.invalidate_route_predictions(1)
+            assert [key[1] for key in coordinator.predictions_cache.keys()] == [2]
+
+    def test_batch_predictions(self, app, mock_routes, sample_training_data):
+        """Test batch predictions match per-route predictions"""
+        with app.app_context():
+            model = PathfinderAI()
+            assert model.init_models()
+            assert model.train(sample_training_data['rf_features'].copy(),
+                               sample_training_data['rf_labels'])
+            
+            batch_predictions = model.predict_batch(mock_routes)
+            assert len(batch_predictions) == len(mock_routes)
+            
+            for mock_route, batch_pred in zip(mock_routes, batch_predictions):
+                single_pred = model.predict_route_properties(
+                    model.prepare_route_features(mock_route)
+                )
+                assert 'error' not in batch_pred
+                assert batch_pred['route_type'] == single_pred['route_type']
+                assert abs(batch_pred['difficulty_score'] - single_pred['difficulty_score']) < 1e-4
+                assert abs(batch_pred['confidence_score'] - single_pred['confidence_score']) < 1e-4
+
+    def test_train_small_multiclass_set(self, app):
+        """Test training on a set too small to stratify its validation split"""
+        with app.app_context():
+            model = PathfinderAI()
+            assert model.init_models()
+            
+            # 10 samples over 3 classes: every class has 2+ rows, but the 2-row validation split can't hold all 3
+            n_samples = 10
+            features = pd.DataFrame({
+                'distance': np.linspace(1, 15, n_samples),
+                'elevation_gain': np.linspace(0, 500, n_samples),
+                'has_sidewalks': np.tile([0, 1], 5),
+                'is_lit': np.tile([1, 0], 5),
+                'surface_type': np.resize(['asphalt', 'dirt', 'grass'], n_samples)
+            })
+            labels = {
+                'route_type': np.resize(['easy', 'moderate', 'challenging'], n_samples),
+                'difficulty': np.linspace(0, 1, n_samples)
+            }
+            
+            assert model.train(features, labels)
+
+    def test_prediction_leaves_features_unchanged(self, app, mock_route):
+        """Test that scaling during prediction does not modify the caller's features"""
+        with app.app_context():
+            model = PathfinderAI()
+            assert model.init_models()
+            
+            features = model.prepare_route_features(mock_route)
+            original = features.copy()
+            model.predict_route_properties(features)
+            model.predict_route_properties(features)
+            
+            np.testing.assert_array_equal(features, original)
+
     def test_edge_cases(self, app):
         """Test prediction behavior with edge cases"""
         with app.app_context():
@@ -349,7 +496,7 @@ class TestPredictions:
                 }
                 
                 with patch('app.models.Route.query') as mock_query:
-                    mock_query.get.return_value = mock_route
+                    mock_query.with_entities.return_value.filter.return_value.first.return_value = mock_route
                     predictions = coordinator.get_route_predictions(
                         route_data['id'],
                         preferences
@@ -363,6 +510,60 @@ class TestPredictions:
                 assert 0 <= predictions['difficulty_score'] <= 1
                 assert 0 <= predictions['quality_score'] <= 1
 
+class TestModelWarmup:
+    """Test suite for the process-wide model coordinator warmup"""
+
+    @pytest.fixture(autouse=True)
+    def reset_warmup(self):
+        """Start each test with no coordinator and no warmup in flight"""
+        def reset():
+            app_package._coordinator = None
+            app_package._coordinator_ready = threading.Event()
+            app_package._warmup_started = False
+            app_package._warmup_retry_at = 0.0
+        reset()
+        yield
+        reset()
+
+    def test_ready(self, app):
+        """Test that a successful warmup returns the loaded coordinator"""
+        with app.app_context(), patch('app.ml.model_coordinator.ModelCoordinator') as coordinator_cls:
+            coordinator_cls.return_value.initialize_models.return_value = True
+            assert app_package.get_model_coordinator(timeout=5) is coordinator_cls.return_value
+            # Later calls reuse it without loading again
+            assert app_package.get_model_coordinator(timeout=0) is coordinator_cls.return_value
+            assert coordinator_cls.call_count == 1
+
+    def test_failed_then_retried(self, app):
+        """Test that a failed warmup returns None and is retried after the backoff"""
+        with app.app_context(), patch('app.ml.model_coordinator.ModelCoordinator') as coordinator_cls:
+            coordinator_cls.return_value.initialize_models.side_effect = [False, True]
+            assert app_package.get_model_coordinator(timeout=5) is None
+
+            # Within the backoff window no new attempt is made
+            assert app_package.get_model_coordinator(timeout=5) is None
+            assert coordinator_cls.call_count == 1
+
+            # Once it has passed, the next call loads again
+            app_package._warmup_retry_at = 0.0
+            assert app_package.get_model_coordinator(timeout=5) is coordinator_cls.return_value
+            assert coordinator_cls.call_count == 2
+
+    def test_timeout(self, app):
+        """Test that callers get None while warmup is still running"""
+        release = threading.Event()
+
+        def slow_initialize():
+            release.wait(5)
+            return True
+
+        with app.app_context(), patch('app.ml.model_coordinator.ModelCoordinator') as coordinator_cls:
+            coordinator_cls.return_value.initialize_models.side_effect = slow_initialize
+            assert app_package.get_model_coordinator(timeout=0.05) is None
+            release.set()
+            assert app_package.get_model_coordinator(timeout=5) is coordinator_cls.return_value
+            assert coordinator_cls.call_count == 1
+
 def test_end_to_end(app, sample_training_data, mock_route):
     """End-to-end test of the entire model pipeline"""
     with app.app_context():
@@ -381,7 +582,7 @@ def test_end_to_end(app, sample_training_data, mock_route):
         }
         
         with patch('app.models.Route.query') as mock_query:
-            mock_query.get.return_value = mock_route
+            mock_query.with_entities.return_value.filter.return_value.first.return_value = mock_route
             predictions = coordinator.get_route_predictions(1, preferences)
         
         assert predictions is not None
@@ -0,0 +1,86 @@
+# tests/test_utils.py
+
+import orjson
+import pytest
+from unittest.mock import MagicMock, patch
+from cachetools import TTLCache
+from flask import Flask
+from app import utils
+
+def geocode_response(status, lat=40.0, lng=-75.0):
+    """Build a fake Geocoding API response"""
+    body = {'status': status, 'results': []}
+    if status == 'OK':
+        body['results'] = [{'geometry': {'location': {'lat': lat, 'lng': lng}}}]
+    response = MagicMock()
+    response.status_code = 200
+    response.content = orjson.dumps(body)
+    return response
+
+@pytest.fixture
+def app():
+    """Create test Flask application"""
+    app = Flask(__name__)
+    app.config['TESTING'] = True
+    with app.app_context():
+        yield app
+
+@pytest.fixture(autouse=True)
+def reset_geocode_state():
+    """Start each test with empty geocode caches and no throttle"""
+    utils._GEOCODE_CACHE.clear()
+    utils._GEOCODE_MISSES.clear()
+    utils._geocode_throttled_until = 0.0
+    yield
+    utils._GEOCODE_CACHE.clear()
+    utils._GEOCODE_MISSES.clear()
+    utils._geocode_throttled_until = 0.0
+
+class TestGeocodeLocation:
+    """Test suite for geocode_location caching"""
+
+    def test_normalized_addresses_share_cache_entry(self, app):
+        """Test that spellings differing in case and spacing hit one cache entry"""
+        with patch.object(utils._SESSION, 'get', return_value=geocode_response('OK')) as get:
+            assert utils.geocode_location('  New   York ') == (40.0, -75.0)
+            assert utils.geocode_location('new york') == (40.0, -75.0)
+
+        get.assert_called_once()
+        assert get.call_args.kwargs['params']['address'] == 'new york'
+        assert list(utils._GEOCODE_CACHE) == ['new york']
+
+    def test_zero_results_cached_briefly(self, app):
+        """Test that ZERO_RESULTS is remembered until the short negative TTL expires"""
+        now = [0.0]
+        misses = TTLCache(maxsize=16, ttl=utils._GEOCODE_MISSES.ttl, timer=lambda: now[0])
+        assert misses.ttl < utils._GEOCODE_CACHE.ttl
+
+        with patch.object(utils, '_GEOCODE_MISSES', misses), \
+             patch.object(utils._SESSION, 'get', return_value=geocode_response('ZERO_RESULTS')) as get:
+            assert utils.geocode_location('nowhere') is None
+            assert utils.geocode_location('nowhere') is None
+            assert get.call_count == 1
+
+            now[0] += misses.ttl + 1
+            assert utils.geocode_location('nowhere') is None
+            assert get.call_count == 2
+
+    def test_over_query_limit_throttles_uncached_lookups(self, app):
+        """Test that OVER_QUERY_LIMIT skips uncached lookups but still serves cached ones"""
+        with patch.object(utils._SESSION, 'get', return_value=geocode_response('OK')):
+            assert utils.geocode_location('boston') == (40.0, -75.0)
+
+        with patch.object(utils._SESSION, 'get', return_value=geocode_response('OVER_QUERY_LIMIT')) as get:
+            assert utils.geocode_location('chicago') is None
+            assert utils.geocode_location('denver') is None
+            assert get.call_count == 1
+            # The quota error isn't cached against the address itself
+            assert 'chicago' not in utils._GEOCODE_MISSES
+
+        assert utils.geocode_location('boston') == (40.0, -75.0)
+
+        # Once the throttle window has passed, lookups reach the API again
+        utils._geocode_throttled_until = 0.0
+        with patch.object(utils._SESSION, 'get', return_value=geocode_response('OK', 39.7, -105.0)) as get:
+            assert utils.geocode_location('denver') == (39.7, -105.0)
+            get.assert_called_once()